@@ -0,0 +1,76 @@
+import itertools
+
+from benchmarks.corpus import CORPUS, NAME
+from benchmarks.timing import best_rate
+from dns_client.packet import DecompressionTable, Packet
+
+ITERATIONS = 2000
+
+
+def bench_build() -> dict[str, float]:
+    request = Packet.build_request(NAME, payload_size=1232)
+    fresh = (f"host{i}.example.com" for i in itertools.count())
+    return {
+        "build_request.cached": best_rate(
+            lambda: Packet.build_request(NAME, payload_size=1232), ITERATIONS * 10
+        ),
+        # a new name every call misses the request template cache
+        "build_request.uncached": best_rate(
+            lambda: Packet.build_request(next(fresh), payload_size=1232), ITERATIONS * 5
+        ),
+        "pack": best_rate(request.pack, ITERATIONS * 50),
+    }
+
+
+def bench_parse() -> dict[str, float]:
+    results = {}
+    for name, build in CORPUS.items():
+        wire = build()
+        records = len(Packet.parse(wire).answers) or 1
+        iterations = max(20, ITERATIONS // records * 4)
+
+        def decode() -> None:
+            packet = Packet.parse(wire)
+            for section in (
+                packet.answers,
+                packet.authoritative_records,
+                packet.additional_records,
+            ):
+                for record in section:
+                    record.data
+
+        results[f"parse.{name}"] = best_rate(lambda: Packet.parse(wire), iterations)
+        results[f"parse_decode.{name}"] = best_rate(decode, iterations)
+
+    return results
+
+
+def bench_names() -> dict[str, float]:
+    wire = CORPUS["compressed_chain"]()
+    packet = Packet.parse(wire)
+    # rdata offsets of every CNAME target, read with a fresh table each time
+    offsets = [a._rdata_offset for a in packet.answers]
+
+    def read_all() -> None:
+        table = DecompressionTable(wire)
+        for offset in offsets:
+            table.read(offset)
+
+    return {"names.compressed_chain": best_rate(read_all, ITERATIONS)}
+
+
+def run() -> dict[str, float]:
+    results = {}
+    results.update(bench_build())
+    results.update(bench_parse())
+    results.update(bench_names())
+    return results
+
+
+def main():
+    for name, rate in run().items():
+        print(f"{name:<32} {rate:>14.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from benchmarks.corpus import single_a
+from benchmarks.timing import percentile
+from dns_client.errors import QueryTimeoutError
+from dns_client.pacing import SendScheduler
+from dns_client.resolver import AsyncResolver
+from dns_client.testing import FakeServer, Zone
+
+QUERIES = 5000
+CONCURRENCY = 100
+LOSS = 0.02
+CAPACITY = 1000
+
+
+class LoopbackServer(asyncio.DatagramProtocol):
+    # answers every query at once with the single A corpus record, echoing
+    # the id and question of the query
+    def __init__(self):
+        self.record = single_a()[12 + 17 :]
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        end = data.index(b"\x00", 12) + 5
+        header = data[:2] + b"\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00"
+        self.transport.sendto(header + data[12:end] + self.record, addr)
+
+
+async def run_queries(
+    port: int,
+    queries: int,
+    concurrency: int,
+    pacer: SendScheduler | None = None,
+) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    window = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    async with AsyncResolver(
+        "127.0.0.1", port, timeout=1, retries=5, payload_size=1232, pacer=pacer
+    ) as resolver:
+
+        async def one(i: int) -> None:
+            async with window:
+                start = loop.time()
+                try:
+                    await resolver.query(f"host{i}.example.com")
+                except QueryTimeoutError:
+                    return
+                latencies.append(loop.time() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(queries)))
+        elapsed = time.perf_counter() - start
+
+    # answered queries per second
+    return len(latencies) / elapsed, latencies
+
+
+async def run_async() -> dict[str, float]:
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        LoopbackServer, local_addr=("127.0.0.1", 0)
+    )
+    port = transport.get_extra_info("sockname")[1]
+    results = {}
+    try:
+        # one query at a time: latency of the client path alone
+        _, latencies = await run_queries(port, QUERIES // 5, 1)
+        results["resolve.serial.p50_us"] = percentile(latencies, 0.5) * 1e6
+        results["resolve.serial.p99_us"] = percentile(latencies, 0.99) * 1e6
+
+        best_qps = 0.0
+        for _ in range(3):
+            qps, latencies = await run_queries(port, QUERIES, CONCURRENCY)
+            best_qps = max(best_qps, qps)
+        results["resolve.concurrent.qps"] = best_qps
+        results["resolve.concurrent.p50_us"] = percentile(latencies, 0.5) * 1e6
+        results["resolve.concurrent.p90_us"] = percentile(latencies, 0.9) * 1e6
+        results["resolve.concurrent.p99_us"] = percentile(latencies, 0.99) * 1e6
+    finally:
+        transport.close()
+
+    # the same load against a server that drops a fixed share of queries:
+    # measures how quickly the retransmission timer recovers
+    zone = Zone.from_text("*.example.com. 300 A 10.0.0.1")
+    async with FakeServer(zone, loss=LOSS, seed=1) as server:
+        qps, latencies = await run_queries(server.port, QUERIES // 5, CONCURRENCY)
+    results["resolve.lossy.qps"] = qps
+    results["resolve.lossy.p99_us"] = percentile(latencies, 0.99) * 1e6
+
+    # a server that drops what it cannot absorb, flooded as fast as the
+    # window allows, and then paced from twice its capacity down by AIMD
+    overload = [("unpaced", None), ("paced", SendScheduler(CAPACITY * 2))]
+    for label, pacer in overload:
+        async with FakeServer(zone, capacity=CAPACITY) as server:
+            qps, latencies = await run_queries(
+                server.port, QUERIES // 2, CONCURRENCY * 2, pacer
+            )
+        results[f"resolve.overload.{label}.qps"] = qps
+        results[f"resolve.overload.{label}.p99_us"] = percentile(latencies, 0.99) * 1e6
+
+    return results
+
+
+def run() -> dict[str, float]:
+    return asyncio.run(run_async())
+
+
+def main():
+    for name, value in run().items():
+        print(f"{name:<32} {value:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+
+def lower_is_better(name: str) -> bool:
+    # latencies are recorded in microseconds; everything else is a rate
+    return name.endswith("_us")
+
+
+def compare(
+    base: dict[str, float], new: dict[str, float], threshold: float
+) -> tuple[list[tuple[str, float, float, float, str]], int]:
+    rows = []
+    regressions = 0
+    for name in sorted(base.keys() & new.keys()):
+        before, after = base[name], new[name]
+        if before == 0:
+            continue
+
+        change = (after - before) / before
+        if lower_is_better(name):
+            change = -change
+
+        verdict = ""
+        if change < -threshold:
+            verdict = "REGRESSION"
+            regressions += 1
+        elif change > threshold:
+            verdict = "faster"
+
+        rows.append((name, before, after, change, verdict))
+
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark result files from benchmarks.run -o"
+    )
+    parser.add_argument("base", help="Results of the baseline revision")
+    parser.add_argument("new", help="Results of the revision under test")
+    parser.add_argument(
+        "-t",
+        type=float,
+        help="Relative change treated as noise (default 0.1, i.e. 10%%)",
+        default=0.1,
+    )
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows, regressions = compare(base["results"], new["results"], args.t)
+    print(f"{'benchmark':<32} {base.get('revision') or 'base':>12} {new.get('revision') or 'new':>12} {'change':>9}")
+    for name, before, after, change, verdict in rows:
+        print(f"{name:<32} {before:>12.0f} {after:>12.0f} {change:>+8.1%} {verdict}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import struct
+
+from dns_client.packet import PacketOpt, RecordType
+
+# Representative wire-format responses to the question below, built by
+# hand so that every revision is measured against identical bytes.
+
+NAME = "example.com"
+QUESTION = b"\x07example\x03com\x00"
+POINTER = b"\xc0\x0c"
+
+
+def header(answers: int, authority: int = 0, additional: int = 0) -> bytes:
+    return struct.pack("!HHHHHH", 0x1234, 0x8180, 1, answers, authority, additional)
+
+
+def question(qtype: RecordType) -> bytes:
+    return QUESTION + struct.pack("!HH", qtype.value, 1)
+
+
+def record(owner: bytes, qtype: RecordType, rdata: bytes, ttl: int = 300) -> bytes:
+    return owner + struct.pack("!HHIH", qtype.value, 1, ttl, len(rdata)) + rdata
+
+
+def label(name: str) -> bytes:
+    return bytes([len(name)]) + name.encode()
+
+
+def single_a() -> bytes:
+    return (
+        header(1)
+        + question(RecordType.A)
+        + record(POINTER, RecordType.A, bytes([93, 184, 216, 34]))
+    )
+
+
+def mx_with_glue(count: int = 10) -> bytes:
+    # MX answers, NS authority and A glue for every exchange, each name
+    # compressed against the question
+    answers, authority, additional = [], [], []
+    offset = 12 + len(QUESTION) + 4
+    exchanges = []
+    for i in range(count):
+        rdata = struct.pack("!H", 10 * (i + 1)) + label(f"mx{i}") + POINTER
+        exchanges.append(offset + 12 + 2)
+        answers.append(record(POINTER, RecordType.MX, rdata))
+        offset += len(answers[-1])
+
+    for i in range(4):
+        authority.append(record(POINTER, RecordType.NS, label(f"ns{i}") + POINTER))
+
+    for i, pointer in enumerate(exchanges):
+        owner = struct.pack("!H", 0xC000 | pointer)
+        additional.append(record(owner, RecordType.A, bytes([10, 0, 0, i])))
+
+    return (
+        header(len(answers), len(authority), len(additional))
+        + question(RecordType.MX)
+        + b"".join(answers + authority + additional)
+    )
+
+
+def compressed_chain(depth: int = 20) -> bytes:
+    # each CNAME target adds one label in front of the previous name, so
+    # every name is a pointer chain through all the ones before it
+    answers = []
+    owner_offset = 12
+    offset = 12 + len(QUESTION) + 4
+    for i in range(depth):
+        rdata = label(f"c{i}") + struct.pack("!H", 0xC000 | owner_offset)
+        answers.append(
+            record(struct.pack("!H", 0xC000 | owner_offset), RecordType.CNAME, rdata)
+        )
+        owner_offset = offset + 12
+        offset += len(answers[-1])
+
+    return header(len(answers)) + question(RecordType.A) + b"".join(answers)
+
+
+def max_size(limit: int = PacketOpt.DEFAULT_PAYLOAD_SIZE) -> bytes:
+    # as many A records as fit in one EDNS0-sized datagram
+    prefix = question(RecordType.A)
+    a = record(POINTER, RecordType.A, bytes([10, 0, 0, 1]))
+    count = (limit - 12 - len(prefix)) // len(a)
+    answers = [
+        record(POINTER, RecordType.A, bytes([10, i // 65536 % 256, i // 256 % 256, i % 256]))
+        for i in range(count)
+    ]
+    return header(count) + prefix + b"".join(answers)
+
+
+def max_size_tcp() -> bytes:
+    return max_size(65535)
+
+
+CORPUS = {
+    "single_a": single_a,
+    "mx_with_glue": mx_with_glue,
+    "compressed_chain": compressed_chain,
+    "max_size_udp": max_size,
+    "max_size_tcp": max_size_tcp,
+}
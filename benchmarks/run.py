@@ -0,0 +1,63 @@
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+
+from benchmarks import bench_packet, bench_resolve
+
+SUITES = {
+    "packet": bench_packet.run,
+    "resolve": bench_resolve.run,
+}
+
+
+def revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return out.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the dns_client benchmarks")
+    parser.add_argument(
+        "-s",
+        action="append",
+        choices=sorted(SUITES),
+        help="Suite to run (default: all); may be repeated",
+    )
+    parser.add_argument("-o", help="Write results as JSON to this file", default=None)
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+    for suite in args.s or sorted(SUITES):
+        print(f"running {suite}...", file=sys.stderr)
+        results.update(SUITES[suite]())
+
+    for name, value in results.items():
+        print(f"{name:<32} {value:>14.0f}")
+
+    if args.o is not None:
+        report = {
+            "revision": revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "results": results,
+        }
+        with open(args.o, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import time
+from typing import Callable
+
+
+def best_rate(fn: Callable[[], object], iterations: int, repeat: int = 5) -> float:
+    # operations per second from the fastest of several runs; the minimum
+    # is the least disturbed by whatever else the machine is doing
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - start)
+
+    return iterations / best
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
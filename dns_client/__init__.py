@@ -0,0 +1,58 @@
+import importlib
+
+# avoid importing typing at startup; type checkers treat this the same way
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from dns_client.api import resolve
+    from dns_client.errors import (
+        ConnectionFailedError,
+        DnsError,
+        FormatError,
+        MalformedPacketError,
+        NameNotFoundError,
+        NotImplementedByServerError,
+        QueryTimeoutError,
+        RecursionNotAvailableError,
+        RefusedError,
+        ResponseError,
+        ServerFailureError,
+        UnexpectedClassError,
+    )
+    from dns_client.resolver import AsyncResolver
+    from dns_client.result import Resolution
+
+__all__ = [
+    "AsyncResolver",
+    "ConnectionFailedError",
+    "DnsError",
+    "FormatError",
+    "MalformedPacketError",
+    "NameNotFoundError",
+    "NotImplementedByServerError",
+    "QueryTimeoutError",
+    "RecursionNotAvailableError",
+    "RefusedError",
+    "Resolution",
+    "ResponseError",
+    "ServerFailureError",
+    "UnexpectedClassError",
+    "resolve",
+]
+
+# exports are imported on first use so that importing a submodule (or the
+# thin client) does not pull in asyncio and the resolver
+_EXPORTS = {
+    "AsyncResolver": "dns_client.resolver",
+    "Resolution": "dns_client.result",
+    "resolve": "dns_client.api",
+}
+
+
+def __getattr__(name: str):
+    if name not in __all__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(_EXPORTS.get(name, "dns_client.errors"))
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
@@ -1,9 +1,24 @@
+from dns_client.bulk import BulkTransmitter
 from dns_client.configuration import Configuration
+from dns_client.daemon import DaemonTransmitter
+from dns_client.sharding import ShardedTransmitter
 from dns_client.transmission import Transmitter
 
 
 def main():
     config = Configuration()
+    if config.listen:
+        DaemonTransmitter(config).transmit()
+        return
+
+    if config.file is not None and config.workers > 0:
+        ShardedTransmitter(config).transmit()
+        return
+
+    if config.file is not None:
+        BulkTransmitter(config).transmit()
+        return
+
     transmitter = Transmitter(config)
     transmitter.transmit()
 
@@ -0,0 +1,54 @@
+import asyncio
+
+from dns_client.cache import ResponseCache
+from dns_client.configuration import Configuration
+from dns_client.disk_cache import DiskCache
+from dns_client.iterative import IterativeResolver
+from dns_client.metrics import Metrics
+from dns_client.pacing import SendScheduler
+from dns_client.packet import PacketOpt
+from dns_client.resolver import AsyncResolver
+from dns_client.result import Resolution
+
+
+def create_resolver(
+    config: Configuration, cache: ResponseCache | None = None
+) -> AsyncResolver | IterativeResolver:
+    metrics = Metrics() if config.metrics_file is not None else None
+    pacer = None
+    if config.rate is not None:
+        pacer = SendScheduler(
+            config.rate / max(1, config.workers), max_outstanding=config.concurrency
+        )
+
+    if config.iterative:
+        return IterativeResolver.from_config(config, metrics=metrics, pacer=pacer)
+
+    if config.cache_file is not None:
+        # the file takes over the given cache's serve-stale and prefetch settings
+        settings = {}
+        if cache is not None:
+            settings = {"stale_ttl": cache.stale_ttl, "prefetch_hits": cache.prefetch_hits}
+        cache = DiskCache(config.cache_file, **settings)
+
+    return AsyncResolver.from_config(config, cache=cache, metrics=metrics, pacer=pacer)
+
+
+def resolve(
+    name: str,
+    server: str | list[str],
+    port: int = 53,
+    mx: bool = False,
+    ns: bool = False,
+    timeout: float = 1.0,
+    retries: int = 3,
+    payload_size: int | None = PacketOpt.DEFAULT_PAYLOAD_SIZE,
+) -> Resolution:
+    async def run() -> Resolution:
+        resolver = AsyncResolver(
+            server, port, timeout=timeout, retries=retries, payload_size=payload_size
+        )
+        async with resolver:
+            return await resolver.resolve(name, mx=mx, ns=ns)
+
+    return asyncio.run(run())
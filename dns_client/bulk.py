@@ -0,0 +1,94 @@
+import asyncio
+import contextlib
+import sys
+from typing import IO, Iterable, Iterator, TextIO
+
+from dns_client.api import create_resolver
+from dns_client.configuration import Configuration
+from dns_client.errors import DnsError
+from dns_client.output import OutputFormat, OutputSink, TextFormat, get_format
+from dns_client.resolver import AsyncResolver
+
+TEXT = TextFormat()
+
+
+def read_names(stream: Iterable[str]) -> Iterator[str]:
+    for line in stream:
+        name = line.strip()
+        if not name or name.startswith("#"):
+            continue
+        yield name
+
+
+@contextlib.contextmanager
+def open_input(path: str) -> Iterator[TextIO]:
+    if path == "-":
+        yield sys.stdin
+        return
+
+    with open(path) as f:
+        yield f
+
+
+async def resolve_line(
+    resolver: AsyncResolver,
+    name: str,
+    mx: bool = False,
+    ns: bool = False,
+    format: OutputFormat = TEXT,
+) -> str | bytes:
+    # record data is decoded while formatting, so a malformed record is
+    # reported as this name's error
+    try:
+        resolution = await resolver.resolve(name, mx=mx, ns=ns)
+        return format.format_resolution(resolution)
+    except DnsError as e:
+        return format.format_error(name, e)
+
+
+class BulkTransmitter:
+    def __init__(self, config: Configuration, output: IO | None = None):
+        self.config = config
+        self.format = get_format(config.output_format)
+        self.output = OutputSink(self.format, output)
+
+    def transmit(self) -> None:
+        with open_input(self.config.file) as f:
+            asyncio.run(self.run(read_names(f)))
+
+    async def run(self, names: Iterable[str]) -> None:
+        window = self.config.concurrency
+        async with create_resolver(self.config) as resolver:
+            pending = set()
+            names = iter(names)
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < window:
+                    name = next(names, None)
+                    if name is None:
+                        exhausted = True
+                        break
+                    pending.add(
+                        asyncio.ensure_future(
+                            resolve_line(
+                                resolver,
+                                name,
+                                mx=self.config.mx,
+                                ns=self.config.ns,
+                                format=self.format,
+                            )
+                        )
+                    )
+
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                self.output.write(self.format.join(task.result() for task in done))
+
+            if resolver.metrics is not None:
+                resolver.metrics.write(self.config.metrics_file)
+
+        self.output.flush()
@@ -0,0 +1,194 @@
+import struct
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from dns_client.packet import Packet, PacketQuestion, RecordType
+
+NXDOMAIN = 3
+
+
+class CacheEntry:
+    __slots__ = ("packet", "expires", "ttl", "hits", "prefetched", "recheck")
+
+    def __init__(self, packet: Packet, expires: float, ttl: float):
+        self.packet = packet
+        self.expires = expires
+        self.ttl = ttl
+        self.hits = 0
+        self.prefetched = False
+        # no refresh is asked for before this time
+        self.recheck = 0.0
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_ttl: int = 86400,
+        clock: Callable[[], float] = time.monotonic,
+        stale_ttl: float = 0,
+        prefetch_hits: int = 0,
+        prefetch_fraction: float = 0.1,
+        failure_recheck: float = 30,
+    ):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        # lookup() keeps serving an expired entry for up to stale_ttl seconds
+        # (RFC 8767), and asks for a refresh of an entry hit prefetch_hits
+        # times once less than prefetch_fraction of its TTL is left. After a
+        # failed refresh, the entry waits failure_recheck seconds before it
+        # asks for another one (RFC 8767 section 5)
+        self.stale_ttl = stale_ttl
+        self.prefetch_hits = prefetch_hits
+        self.prefetch_fraction = prefetch_fraction
+        self.failure_recheck = failure_recheck
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.prefetches = 0
+        self.__entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    @staticmethod
+    def key(name: str, qtype: int, qclass: int = PacketQuestion.QCLASS) -> tuple:
+        return (name.lower().rstrip("."), qtype, qclass)
+
+    def get(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> Packet | None:
+        key = self.key(name, qtype, qclass)
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        remaining = entry.expires - self.clock()
+        if remaining <= 0:
+            if remaining <= -self.stale_ttl:
+                del self.__entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return entry.packet
+
+    def lookup(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> tuple[Packet | None, bool]:
+        # like get(), but may return a stale entry; the flag asks the caller
+        # to refresh the entry in the background
+        key = self.key(name, qtype, qclass)
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, False
+
+        now = self.clock()
+        remaining = entry.expires - now
+        if remaining <= -self.stale_ttl:
+            del self.__entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None, False
+
+        self.__entries.move_to_end(key)
+        entry.hits += 1
+        if remaining <= 0:
+            self.stale_hits += 1
+            return entry.packet, now >= entry.recheck
+
+        self.hits += 1
+        if (
+            self.prefetch_hits
+            and not entry.prefetched
+            and entry.hits >= self.prefetch_hits
+            and remaining <= entry.ttl * self.prefetch_fraction
+        ):
+            entry.prefetched = True
+            self.prefetches += 1
+            return entry.packet, True
+
+        return entry.packet, False
+
+    def age(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> tuple[float, bool] | None:
+        # seconds since the entry was stored and whether it is past its TTL,
+        # without counting as a lookup
+        entry = self.__entries.get(self.key(name, qtype, qclass))
+        if entry is None:
+            return None
+
+        remaining = entry.expires - self.clock()
+        return entry.ttl - remaining, remaining <= 0
+
+    def refresh_failed(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> None:
+        entry = self.__entries.get(self.key(name, qtype, qclass))
+        if entry is not None:
+            entry.recheck = self.clock() + self.failure_recheck
+
+    def put(
+        self,
+        name: str,
+        qtype: int,
+        packet: Packet,
+        qclass: int = PacketQuestion.QCLASS,
+    ) -> bool:
+        ttl = self.get_ttl(packet)
+        if ttl is None or ttl <= 0:
+            return False
+
+        key = self.key(name, qtype, qclass)
+        ttl = min(ttl, self.max_ttl)
+        self.__entries[key] = CacheEntry(packet, self.clock() + ttl, ttl)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+        return True
+
+    def clear(self) -> None:
+        self.__entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.__entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "prefetches": self.prefetches,
+        }
+
+    @classmethod
+    def get_ttl(cls, packet: Packet) -> int | None:
+        rcode = packet.header.response_code
+        if rcode == 0 and packet.answers:
+            return min(a.ttl for a in packet.answers)
+
+        if rcode == 0 or rcode == NXDOMAIN:
+            return cls.__get_negative_ttl(packet)
+
+        return None
+
+    @staticmethod
+    def __get_negative_ttl(packet: Packet) -> int | None:
+        # RFC 2308: negative answers live for min(SOA TTL, SOA MINIMUM)
+        for record in packet.authoritative_records:
+            if record.data_type == RecordType.SOA.value and len(record.raw) >= 4:
+                (minimum,) = struct.unpack("!I", record.raw[-4:])
+                return min(record.ttl, minimum)
+
+        return None
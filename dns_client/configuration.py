@@ -1,25 +1,41 @@
 import argparse
 
+from dns_client.output import FORMATS
+from dns_client.packet import PacketOpt
+
 
 class Configuration:
     def __init__(self):
         args = self.__parse_args()
-        self.timeout = int(args.t)
+        self.timeout = float(args.t)
         self.retries = int(args.r)
         self.port = int(args.p)
         self.mx = bool(args.mx)
         self.ns = bool(args.ns)
-        self.server = str(args.server).strip("@")
-        self.name = str(args.name)
+        self.servers = [s.strip().strip("@") for s in str(args.server).split(",")]
+        self.server = self.servers[0]
+        self.name = str(args.name) if args.name is not None else None
+        self.file = args.f
+        self.concurrency = int(args.c)
+        self.payload_size = int(args.e) or None
+        self.workers = int(args.w)
+        self.ordered = bool(args.o)
+        self.iterative = bool(args.i)
+        self.output_format = str(args.F)
+        self.cache_file = args.d
+        self.listen = args.l or []
+        self.metrics_file = args.M
+        self.stale_ttl = float(args.s)
+        self.rate = args.q
 
     def __parse_args(self):
         parser = argparse.ArgumentParser(description="Simple DNS Client")
         group = parser.add_mutually_exclusive_group()
         parser.add_argument(
             "-t",
-            type=int,
-            help="Timeout, in seconds, before retransmitting an unanswered query",
-            default=5,
+            type=float,
+            help="Initial timeout, in seconds, before retransmitting an unanswered query; adapts to the measured RTT with exponential backoff",
+            default=1.0,
         )
         parser.add_argument(
             "-r",
@@ -30,6 +46,12 @@ class Configuration:
         parser.add_argument(
             "-p", type=int, help="UDP port number of the DNS server", default=53
         )
+        parser.add_argument(
+            "-e",
+            type=int,
+            help="EDNS0 UDP payload size to advertise (0 disables EDNS0)",
+            default=PacketOpt.DEFAULT_PAYLOAD_SIZE,
+        )
         group.add_argument(
             "-mx", action="store_true", help="Send a MX (mail server) query"
         )
@@ -37,8 +59,88 @@ class Configuration:
             "-ns", action="store_true", help="Send a NS (name server) query"
         )
         parser.add_argument(
-            "server", help="IPv4 address of the DNS server, in a.b.c.d format"
+            "server",
+            help="IPv4 address of the DNS server, in a.b.c.d format; several comma-separated servers are raced by measured latency",
+        )
+        parser.add_argument(
+            "-i",
+            action="store_true",
+            help="Resolve iteratively, following referrals from server ('.' for the built-in root hints)",
+        )
+        parser.add_argument(
+            "-d",
+            help="Persistent answer cache (SQLite file) shared across runs; unexpired answers are served from it without querying the server (ignored with -i)",
+            default=None,
+        )
+        parser.add_argument(
+            "-f",
+            help="Bulk mode: file with one domain name per line ('-' for stdin)",
+            default=None,
+        )
+        parser.add_argument(
+            "-c",
+            type=int,
+            help="Maximum number of outstanding queries in bulk mode (per worker with -w)",
+            default=100,
+        )
+        parser.add_argument(
+            "-w",
+            type=int,
+            help="Bulk mode: shard the input across this many worker processes",
+            default=0,
+        )
+        parser.add_argument(
+            "-o",
+            action="store_true",
+            help="Bulk mode with -w: write results in input order instead of completion order",
+        )
+        parser.add_argument(
+            "-F",
+            choices=sorted(FORMATS),
+            help="Bulk mode output format: text, JSON Lines, CSV, or length-prefixed raw responses (binary)",
+            default="text",
+        )
+        parser.add_argument(
+            "-l",
+            action="append",
+            help="Daemon mode: answer queries on this address, either host:port for DNS over UDP and TCP, or a Unix socket path taking one name per line (see dns_client.thin); may be repeated",
+            default=None,
+        )
+        parser.add_argument(
+            "-q",
+            type=float,
+            help="Send at most this many queries per second to each server (shared by the -w workers); -c then also caps each server's unanswered queries, and the rate is halved while more than 5%% of queries time out and raised again as they recover",
+            default=None,
+        )
+        parser.add_argument(
+            "-s",
+            type=float,
+            help="Daemon mode: keep answering with an expired answer for up to this many seconds while it is refreshed in the background or the server is failing",
+            default=0.0,
+        )
+        parser.add_argument(
+            "-M",
+            help="Write query metrics (per-phase timings, latency histograms, counters) to this file on exit: JSON for a .json path, Prometheus text otherwise, '-' for stderr (not with -w)",
+            default=None,
         )
-        parser.add_argument("name", help="Domain name to query for")
+        parser.add_argument("name", nargs="?", help="Domain name to query for")
         args = parser.parse_args()
+        if args.name is None and args.f is None and not args.l:
+            parser.error(
+                "a domain name, a bulk input file (-f) or a daemon address (-l) is required"
+            )
+        if args.t <= 0:
+            parser.error("-t must be positive")
+        if args.c < 1:
+            parser.error("-c must be at least 1")
+        if args.w < 0:
+            parser.error("-w must not be negative")
+        if args.q is not None and args.q <= 0:
+            parser.error("-q must be positive")
+        if args.s < 0:
+            parser.error("-s must not be negative")
+        if args.M is not None and args.w > 0:
+            parser.error("-M cannot be combined with -w")
+        if args.e != 0 and not 512 <= args.e <= 65535:
+            parser.error("-e must be 0 or between 512 and 65535")
         return args
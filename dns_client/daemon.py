@@ -0,0 +1,356 @@
+import asyncio
+import contextlib
+import os
+import struct
+
+from dns_client.api import create_resolver
+from dns_client.bulk import resolve_line
+from dns_client.cache import ResponseCache
+from dns_client.configuration import Configuration
+from dns_client.errors import DnsError, MalformedPacketError, ResponseError
+from dns_client.iterative import IterativeResolver
+from dns_client.output import OutputFormat, TextFormat, get_format
+from dns_client.packet import DecompressionTable, PacketAnswer, PacketOpt, RecordType
+from dns_client.resolver import AsyncResolver
+from dns_client.tcp import frame
+
+FORMERR = 1
+SERVFAIL = 2
+NOTIMP = 4
+
+UDP_PAYLOAD_SIZE = 512
+
+# answers looked up this often are refreshed before they expire
+PREFETCH_HITS = 3
+
+# TTL of answers served past their expiry, as RFC 8767 recommends
+STALE_ANSWER_TTL = 30
+
+
+class QueryError(Exception):
+    def __init__(self, rcode: int, question_end: int = 12):
+        super().__init__(rcode)
+        self.rcode = rcode
+        self.question_end = question_end
+
+
+class LocalDaemon:
+    # Answers DNS queries over UDP and TCP, and one-name-per-line requests
+    # over a Unix socket, through a single long-lived resolver so that
+    # every client shares its cache and upstream sockets.
+    def __init__(
+        self,
+        resolver: AsyncResolver | IterativeResolver,
+        format: OutputFormat | None = None,
+        concurrency: int = 100,
+    ):
+        self.resolver = resolver
+        self.format = format or TextFormat()
+        self.concurrency = concurrency
+        self.queries = 0
+        self.__servers: list[asyncio.AbstractServer] = []
+        self.__transports: list[asyncio.BaseTransport] = []
+        self.__tasks: set[asyncio.Task] = set()
+
+    async def listen(self, address: str) -> None:
+        loop = asyncio.get_running_loop()
+        host, port = parse_address(address)
+        if port is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(host)
+            self.__servers.append(
+                await asyncio.start_unix_server(self.__serve_lines, path=host)
+            )
+            return
+
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DaemonProtocol(self), local_addr=(host, port)
+        )
+        self.__transports.append(transport)
+        # a port of 0 picks one for UDP; TCP follows on the same number
+        port = transport.get_extra_info("sockname")[1]
+        self.__servers.append(
+            await asyncio.start_server(self.__serve_tcp, host, port)
+        )
+
+    def addresses(self) -> list:
+        return [t.get_extra_info("sockname") for t in self.__transports] + [
+            s.sockets[0].getsockname() for s in self.__servers
+        ]
+
+    async def serve_forever(self) -> None:
+        await asyncio.gather(*(s.serve_forever() for s in self.__servers))
+
+    def close(self) -> None:
+        for server in self.__servers:
+            server.close()
+        for transport in self.__transports:
+            transport.close()
+        for task in self.__tasks:
+            task.cancel()
+        self.__servers.clear()
+        self.__transports.clear()
+        self.resolver.close()
+
+    async def __aenter__(self) -> "LocalDaemon":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    async def answer(self, query: bytes, udp: bool = False) -> bytes:
+        try:
+            name, qtype, question_end, payload_size = parse_query(query)
+        except QueryError as e:
+            return error_response(query, e.rcode, e.question_end)
+
+        self.queries += 1
+        mx = qtype == RecordType.MX.value
+        ns = qtype == RecordType.NS.value
+        try:
+            age = None
+            if isinstance(self.resolver, IterativeResolver):
+                response = (await self.resolver.resolve(name, mx=mx, ns=ns)).packet
+            else:
+                response = await self.resolver.query(name, mx=mx, ns=ns)
+                if self.resolver.cache is not None:
+                    age = self.resolver.cache.age(name, qtype)
+        except ResponseError as e:
+            return error_response(query, e.response_code or SERVFAIL, question_end)
+        except DnsError:
+            return error_response(query, SERVFAIL, question_end)
+
+        wire = adjust_response(response.wire, age, payload_size is not None)
+        if udp and len(wire) > (payload_size or UDP_PAYLOAD_SIZE):
+            return error_response(query, 0, question_end, truncated=True)
+
+        wire[0:2] = query[0:2]
+        return bytes(wire)
+
+    def _on_datagram(self, transport: asyncio.DatagramTransport, data: bytes, addr) -> None:
+        task = asyncio.ensure_future(self.answer(data, udp=True))
+        self.__tasks.add(task)
+
+        def reply(t: asyncio.Task) -> None:
+            self.__tasks.discard(t)
+            if t.cancelled() or t.exception() is not None or transport.is_closing():
+                return
+            if response := t.result():
+                transport.sendto(response, addr)
+
+        task.add_done_callback(reply)
+
+    async def __serve_tcp(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # queries on one connection are answered concurrently (RFC 7766)
+        pending: set[asyncio.Task] = set()
+
+        def reply(t: asyncio.Task) -> None:
+            pending.discard(t)
+            if not t.cancelled() and t.exception() is None and not writer.is_closing():
+                writer.write(frame(t.result()))
+
+        try:
+            while True:
+                try:
+                    (length,) = struct.unpack("!H", await reader.readexactly(2))
+                    query = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                task = asyncio.ensure_future(self.answer(query))
+                task.add_done_callback(reply)
+                pending.add(task)
+
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            writer.close()
+
+    async def __serve_lines(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # one request per line ("name", "name MX" or "name NS"); replies are
+        # written in request order in the daemon's output format
+        window = asyncio.Semaphore(self.concurrency)
+        replies: asyncio.Queue = asyncio.Queue()
+
+        async def write_replies() -> None:
+            while (task := await replies.get()) is not None:
+                chunk = await task
+                window.release()
+                if writer.is_closing():
+                    continue
+
+                writer.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    writer.close()
+
+        writer_task = asyncio.ensure_future(write_replies())
+        try:
+            while line := await reader.readline():
+                request = line.decode(errors="replace").split()
+                if not request or request[0].startswith("#"):
+                    continue
+
+                qtype = request[1].upper() if len(request) > 1 else "A"
+                await window.acquire()
+                replies.put_nowait(
+                    asyncio.ensure_future(
+                        resolve_line(
+                            self.resolver,
+                            request[0],
+                            mx=qtype == "MX",
+                            ns=qtype == "NS",
+                            format=self.format,
+                        )
+                    )
+                )
+                self.queries += 1
+
+            replies.put_nowait(None)
+            await writer_task
+        except ConnectionError:
+            writer_task.cancel()
+        finally:
+            writer.close()
+
+
+class _DaemonProtocol(asyncio.DatagramProtocol):
+    def __init__(self, daemon: LocalDaemon):
+        self.daemon = daemon
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.daemon._on_datagram(self.transport, data, addr)
+
+
+def parse_address(address: str) -> tuple[str, int | None]:
+    if "/" in address or ":" not in address:
+        return address, None
+
+    host, _, port = address.rpartition(":")
+    return host.strip("[]") or "127.0.0.1", int(port)
+
+
+def parse_query(query: bytes) -> tuple[str, int, int, int | None]:
+    # the payload size is None for a query without an OPT record
+    if len(query) < 12:
+        raise QueryError(FORMERR)
+
+    flags, qdcount, ancount, nscount, arcount = struct.unpack_from("!HHHHH", query, 2)
+    if flags & 0x8000:
+        raise QueryError(FORMERR)
+    if (flags >> 11) & 0x0F != 0:
+        raise QueryError(NOTIMP)
+    if qdcount != 1:
+        raise QueryError(FORMERR)
+
+    names = DecompressionTable(query)
+    try:
+        name, pointer = names.read(12)
+        qtype, qclass = struct.unpack_from("!HH", query, pointer)
+    except (MalformedPacketError, struct.error):
+        raise QueryError(FORMERR) from None
+
+    question_end = pointer + 4
+    if qclass != 1 or qtype not in (
+        RecordType.A.value,
+        RecordType.MX.value,
+        RecordType.NS.value,
+    ):
+        raise QueryError(NOTIMP, question_end)
+
+    payload_size = None
+    try:
+        records, _ = PacketAnswer.build_answer(
+            query, question_end, ancount + nscount + arcount, names
+        )
+    except MalformedPacketError:
+        raise QueryError(FORMERR, question_end) from None
+
+    for record in records:
+        if record.data_type == PacketOpt.TYPE:
+            payload_size = max(record.clazz, UDP_PAYLOAD_SIZE)
+
+    return name, qtype, question_end, payload_size
+
+
+def adjust_response(
+    wire: bytes, age: tuple[float, bool] | None, edns: bool
+) -> bytearray:
+    # count record TTLs down by the time the answer spent in the cache (a
+    # stale answer gets STALE_ANSWER_TTL), and drop the OPT record when the
+    # query had none (RFC 6891 section 7)
+    names = DecompressionTable(wire)
+    wire = bytearray(wire)
+    _, pointer = names.read(12)
+    pointer += 4
+    ancount, nscount, arcount = struct.unpack_from("!HHH", wire, 6)
+    opt = None
+    for _ in range(ancount + nscount + arcount):
+        _, end = names.read(pointer)
+        rtype, _, ttl, rdlength = struct.unpack_from("!HHIH", wire, end)
+        if rtype == PacketOpt.TYPE:
+            opt = (pointer, end + 10 + rdlength)
+        elif age is not None:
+            elapsed, stale = age
+            ttl = STALE_ANSWER_TTL if stale else max(0, ttl - int(elapsed))
+            struct.pack_into("!I", wire, end + 4, ttl)
+        pointer = end + 10 + rdlength
+
+    if opt is not None and not edns:
+        del wire[opt[0] : opt[1]]
+        struct.pack_into("!H", wire, 10, arcount - 1)
+
+    return wire
+
+
+def error_response(
+    query: bytes, rcode: int, question_end: int = 12, truncated: bool = False
+) -> bytes:
+    if len(query) < 12:
+        return b""
+
+    (flags,) = struct.unpack_from("!H", query, 2)
+    # echo opcode and RD, set QR and RA
+    flags = 0x8000 | (flags & 0x7900) | 0x0080 | rcode
+    if truncated:
+        flags |= 0x0200
+    qdcount = 1 if question_end > 12 else 0
+    return (
+        query[0:2]
+        + struct.pack("!HHHHH", flags, qdcount, 0, 0, 0)
+        + query[12:question_end]
+    )
+
+
+class DaemonTransmitter:
+    def __init__(self, config: Configuration):
+        self.config = config
+
+    def transmit(self) -> None:
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            pass
+
+    async def run(self) -> None:
+        cache = ResponseCache(stale_ttl=self.config.stale_ttl, prefetch_hits=PREFETCH_HITS)
+        resolver = create_resolver(self.config, cache=cache)
+        daemon = LocalDaemon(
+            resolver, get_format(self.config.output_format), self.config.concurrency
+        )
+        async with daemon:
+            try:
+                for address in self.config.listen:
+                    await daemon.listen(address)
+                await daemon.serve_forever()
+            finally:
+                if resolver.metrics is not None:
+                    resolver.metrics.write(self.config.metrics_file)
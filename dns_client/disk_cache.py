@@ -0,0 +1,234 @@
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from dns_client.cache import ResponseCache
+from dns_client.packet import Packet, PacketQuestion
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    name TEXT NOT NULL,
+    qtype INTEGER NOT NULL,
+    qclass INTEGER NOT NULL,
+    wire BLOB NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (name, qtype, qclass)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS answers_expires ON answers (expires);
+"""
+
+
+class EntryState:
+    __slots__ = ("hits", "prefetched", "recheck")
+
+    def __init__(self):
+        self.hits = 0
+        self.prefetched = False
+        self.recheck = 0.0
+
+
+# Wire-format responses in a SQLite file, shared between invocations.
+# Expiry times are absolute wall-clock times so entries survive restarts.
+# WAL mode lets parallel invocations read while one writes; a database
+# that stays locked past the busy timeout counts as a miss, not an error.
+class DiskCache:
+    PRUNE_INTERVAL = 256
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100000,
+        max_ttl: int = 86400,
+        busy_timeout: float = 1.0,
+        clock: Callable[[], float] = time.time,
+        stale_ttl: float = 0,
+        prefetch_hits: int = 0,
+        prefetch_fraction: float = 0.1,
+        failure_recheck: float = 30,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        # serve-stale and prefetch as in ResponseCache; expired rows are kept
+        # on disk for stale_ttl seconds, while hit counts and recheck times
+        # belong to this process and are not shared through the file
+        self.stale_ttl = stale_ttl
+        self.prefetch_hits = prefetch_hits
+        self.prefetch_fraction = prefetch_fraction
+        self.failure_recheck = failure_recheck
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.prefetches = 0
+        self.__puts = 0
+        self.__states: OrderedDict[tuple, EntryState] = OrderedDict()
+        self.__db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__db.execute("PRAGMA synchronous=NORMAL")
+        self.__db.executescript(SCHEMA)
+        self.prune()
+
+    def __len__(self) -> int:
+        return self.__db.execute("SELECT count(*) FROM answers").fetchone()[0]
+
+    def get(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> Packet | None:
+        row = self.__row(ResponseCache.key(name, qtype, qclass))
+        if row is None:
+            self.misses += 1
+            return None
+
+        wire, expires = row
+        if expires <= self.clock():
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return Packet.parse(wire)
+
+    def lookup(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> tuple[Packet | None, bool]:
+        # like get(), but may return a stale entry; the flag asks the caller
+        # to refresh the entry in the background
+        key = ResponseCache.key(name, qtype, qclass)
+        row = self.__row(key)
+        if row is None:
+            self.misses += 1
+            return None, False
+
+        wire, expires = row
+        now = self.clock()
+        remaining = expires - now
+        if remaining <= -self.stale_ttl:
+            self.expirations += 1
+            self.misses += 1
+            return None, False
+
+        packet = Packet.parse(wire)
+        state = self.__state(key)
+        state.hits += 1
+        if remaining <= 0:
+            self.stale_hits += 1
+            return packet, now >= state.recheck
+
+        self.hits += 1
+        if (
+            self.prefetch_hits
+            and not state.prefetched
+            and state.hits >= self.prefetch_hits
+            and remaining <= min(ResponseCache.get_ttl(packet), self.max_ttl) * self.prefetch_fraction
+        ):
+            state.prefetched = True
+            self.prefetches += 1
+            return packet, True
+
+        return packet, False
+
+    def age(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> tuple[float, bool] | None:
+        row = self.__row(ResponseCache.key(name, qtype, qclass))
+        if row is None:
+            return None
+
+        # only the expiry time is stored; the TTL comes from the answer
+        wire, expires = row
+        ttl = min(ResponseCache.get_ttl(Packet.parse(wire)), self.max_ttl)
+        remaining = expires - self.clock()
+        return ttl - remaining, remaining <= 0
+
+    def refresh_failed(
+        self, name: str, qtype: int, qclass: int = PacketQuestion.QCLASS
+    ) -> None:
+        key = ResponseCache.key(name, qtype, qclass)
+        self.__state(key).recheck = self.clock() + self.failure_recheck
+
+    def put(
+        self,
+        name: str,
+        qtype: int,
+        packet: Packet,
+        qclass: int = PacketQuestion.QCLASS,
+    ) -> bool:
+        ttl = ResponseCache.get_ttl(packet)
+        if ttl is None or ttl <= 0 or packet.wire is None:
+            return False
+
+        key = ResponseCache.key(name, qtype, qclass)
+        expires = self.clock() + min(ttl, self.max_ttl)
+        try:
+            self.__db.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                key + (bytes(packet.wire), expires),
+            )
+        except sqlite3.OperationalError:
+            return False
+
+        self.__states.pop(key, None)
+        self.__puts += 1
+        if self.__puts % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+        return True
+
+    def prune(self) -> None:
+        # drop entries past their stale window, then the ones closest to
+        # expiry until the cache is back under max_entries
+        try:
+            expired = self.__db.execute(
+                "DELETE FROM answers WHERE expires <= ?", (self.clock() - self.stale_ttl,)
+            ).rowcount
+            self.expirations += expired
+
+            excess = len(self) - self.max_entries
+            if excess > 0:
+                self.evictions += self.__db.execute(
+                    "DELETE FROM answers WHERE (name, qtype, qclass) IN "
+                    "(SELECT name, qtype, qclass FROM answers ORDER BY expires LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        except sqlite3.OperationalError:
+            pass
+
+    def clear(self) -> None:
+        self.__db.execute("DELETE FROM answers")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_hits": self.stale_hits,
+            "prefetches": self.prefetches,
+        }
+
+    def __row(self, key: tuple) -> tuple[bytes, float] | None:
+        try:
+            return self.__db.execute(
+                "SELECT wire, expires FROM answers WHERE name = ? AND qtype = ? AND qclass = ?",
+                key,
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    def __state(self, key: tuple) -> EntryState:
+        state = self.__states.get(key)
+        if state is None:
+            state = self.__states[key] = EntryState()
+        self.__states.move_to_end(key)
+        while len(self.__states) > self.max_entries:
+            self.__states.popitem(last=False)
+        return state
+
+    def close(self) -> None:
+        self.prune()
+        self.__db.close()
@@ -0,0 +1,57 @@
+class DnsError(Exception):
+    pass
+
+
+class QueryTimeoutError(DnsError, TimeoutError):
+    pass
+
+
+class ConnectionFailedError(DnsError, ConnectionError):
+    pass
+
+
+class MalformedPacketError(DnsError, ValueError):
+    pass
+
+
+class UnexpectedClassError(MalformedPacketError):
+    pass
+
+
+class ResponseError(DnsError):
+    def __init__(self, message: str, response_code: int = 0):
+        super().__init__(message)
+        self.response_code = response_code
+
+
+class RecursionNotAvailableError(ResponseError):
+    pass
+
+
+class FormatError(ResponseError):
+    pass
+
+
+class ServerFailureError(ResponseError):
+    pass
+
+
+class NameNotFoundError(ResponseError):
+    pass
+
+
+class NotImplementedByServerError(ResponseError):
+    pass
+
+
+class RefusedError(ResponseError):
+    pass
+
+
+RESPONSE_ERRORS: dict[int, type[ResponseError]] = {
+    1: FormatError,
+    2: ServerFailureError,
+    3: NameNotFoundError,
+    4: NotImplementedByServerError,
+    5: RefusedError,
+}
@@ -0,0 +1,329 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from dns_client.configuration import Configuration
+from dns_client.errors import DnsError
+from dns_client.metrics import Metrics
+from dns_client.pacing import SendScheduler
+from dns_client.packet import Packet, PacketAnswer, PacketQuestion, RecordType
+from dns_client.resolver import AsyncResolver
+from dns_client.result import Resolution
+
+ROOT_HINTS = [
+    ("a.root-servers.net", "198.41.0.4"),
+    ("b.root-servers.net", "170.247.170.2"),
+    ("c.root-servers.net", "192.33.4.12"),
+    ("d.root-servers.net", "199.7.91.13"),
+    ("e.root-servers.net", "192.203.230.10"),
+    ("f.root-servers.net", "192.5.5.241"),
+    ("g.root-servers.net", "192.112.36.4"),
+    ("h.root-servers.net", "198.97.190.53"),
+    ("i.root-servers.net", "192.36.148.17"),
+    ("j.root-servers.net", "192.58.128.30"),
+    ("k.root-servers.net", "193.0.14.129"),
+    ("l.root-servers.net", "199.7.83.42"),
+    ("m.root-servers.net", "202.12.27.33"),
+]
+
+
+def normalize(name: str) -> str:
+    return name.lower().rstrip(".")
+
+
+def is_subdomain(name: str, zone: str) -> bool:
+    return zone == "" or name == zone or name.endswith("." + zone)
+
+
+class ZoneCut:
+    __slots__ = ("zone", "addresses", "expires")
+
+    def __init__(self, zone: str, addresses: list[str], expires: float):
+        self.zone = zone
+        self.addresses = addresses
+        self.expires = expires
+
+
+class DelegationCache:
+    # Zone cuts and nameserver addresses, each table bounded to max_entries
+    # in LRU order. Expired entries are dropped when they are looked up and
+    # otherwise age out through the LRU order.
+    def __init__(
+        self,
+        root_servers: list[str],
+        max_ttl: int = 86400,
+        clock: Callable[[], float] = time.monotonic,
+        max_entries: int = 10000,
+    ):
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.__root = ZoneCut("", root_servers, float("inf"))
+        self.__cuts: OrderedDict[str, ZoneCut] = OrderedDict()
+        self.__addresses: OrderedDict[str, tuple[list[str], float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__cuts) + len(self.__addresses)
+
+    def find(self, name: str) -> ZoneCut:
+        now = self.clock()
+        labels = normalize(name).split(".")
+        for i in range(len(labels)):
+            zone = ".".join(labels[i:])
+            cut = self.__cuts.get(zone)
+            if cut is None:
+                continue
+            if cut.expires <= now:
+                del self.__cuts[zone]
+                continue
+
+            self.__cuts.move_to_end(zone)
+            return cut
+
+        return self.__root
+
+    def add_cut(self, zone: str, addresses: list[str], ttl: int) -> ZoneCut:
+        cut = ZoneCut(zone, addresses, self.clock() + min(ttl, self.max_ttl))
+        self.__cuts[zone] = cut
+        self.__bound(self.__cuts, zone)
+        return cut
+
+    def get_addresses(self, nameserver: str) -> list[str]:
+        key = normalize(nameserver)
+        entry = self.__addresses.get(key)
+        if entry is None:
+            return []
+        if entry[1] <= self.clock():
+            del self.__addresses[key]
+            return []
+
+        self.__addresses.move_to_end(key)
+        return entry[0]
+
+    def add_addresses(self, nameserver: str, addresses: list[str], ttl: int) -> None:
+        key = normalize(nameserver)
+        expires = self.clock() + min(ttl, self.max_ttl)
+        self.__addresses[key] = (addresses, expires)
+        self.__bound(self.__addresses, key)
+
+    def __bound(self, entries: OrderedDict, key: str) -> None:
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def zones(self) -> list[str]:
+        now = self.clock()
+        return [zone for zone, cut in self.__cuts.items() if cut.expires > now]
+
+
+class IterativeResolver:
+    MAX_REFERRALS = 16
+    MAX_CNAMES = 8
+    MAX_RESOLVERS = 256
+
+    def __init__(
+        self,
+        root_servers: list[str] | None = None,
+        port: int = 53,
+        timeout: float = 1.0,
+        retries: int = 2,
+        payload_size: int | None = None,
+        delegations: DelegationCache | None = None,
+        metrics: Metrics | None = None,
+        pacer: SendScheduler | None = None,
+    ):
+        if root_servers is None:
+            root_servers = [address for _, address in ROOT_HINTS]
+
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.payload_size = payload_size
+        self.delegations = delegations or DelegationCache(root_servers)
+        self.metrics = metrics
+        self.pacer = pacer
+        self.__resolvers: dict[tuple[str, ...], AsyncResolver] = {}
+
+    @classmethod
+    def from_config(cls, config: Configuration, **kwargs) -> "IterativeResolver":
+        root_servers = None if config.servers == ["."] else config.servers
+        return cls(
+            root_servers,
+            config.port,
+            timeout=config.timeout,
+            retries=config.retries,
+            payload_size=config.payload_size,
+            **kwargs,
+        )
+
+    async def __aenter__(self) -> "IterativeResolver":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for resolver in self.__resolvers.values():
+            resolver.close()
+        self.__resolvers.clear()
+
+    async def resolve(
+        self, name: str, mx: bool = False, ns: bool = False
+    ) -> Resolution:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        qtype = PacketQuestion(name, mx, ns).qtype
+
+        chain: list[PacketAnswer] = []
+        retries = 0
+        target = name
+        for _ in range(self.MAX_CNAMES):
+            response, attempts = await self.__resolve_once(target, mx, ns)
+            retries += attempts
+
+            answers = response.answers
+            cnames = [a for a in answers if a.data_type == RecordType.CNAME.value]
+            if answers and len(cnames) == len(answers) and qtype != RecordType.CNAME:
+                chain.extend(cnames)
+                target = cnames[-1].data
+                continue
+
+            resolution = Resolution(
+                name, qtype, response, elapsed=loop.time() - start, retries=retries
+            )
+            resolution.answers = chain + answers
+            return resolution
+
+        raise DnsError(f"CNAME chain for {name} is longer than {self.MAX_CNAMES}")
+
+    async def __resolve_once(
+        self, name: str, mx: bool, ns: bool, depth: int = 0
+    ) -> tuple[Packet, int]:
+        qname = normalize(name)
+        cut = self.delegations.find(qname)
+        retries = 0
+        for _ in range(self.MAX_REFERRALS):
+            request = Packet.build_request(
+                name, mx=mx, ns=ns, payload_size=self.payload_size, recursive=False
+            )
+            response, attempts = await self.__resolver(cut).exchange(request)
+            retries += attempts
+            response.header.validateHeaderErrors(recursive=False)
+
+            if response.answers:
+                return response, retries
+
+            child, nameservers, ttl = self.__get_referral(response, cut.zone, qname)
+            if child is None:
+                # authoritative NODATA
+                return response, retries
+
+            addresses = self.__get_glue(response, nameservers, cut.zone)
+            if not addresses:
+                addresses = await self.__resolve_nameservers(nameservers, depth)
+            if not addresses:
+                raise DnsError(f"No usable nameserver addresses for zone {child}")
+
+            cut = self.delegations.add_cut(child, addresses, ttl)
+
+        raise DnsError(f"Too many referrals while resolving {name}")
+
+    def __resolver(self, cut: ZoneCut) -> AsyncResolver:
+        key = tuple(cut.addresses)
+        resolver = self.__resolvers.get(key)
+        if resolver is None:
+            if len(self.__resolvers) >= self.MAX_RESOLVERS:
+                # closing a resolver fails its exchanges, so busy ones stay
+                # open and the limit is exceeded until they finish
+                idle = next((k for k, r in self.__resolvers.items() if r.idle()), None)
+                if idle is not None:
+                    self.__resolvers.pop(idle).close()
+
+            resolver = AsyncResolver(
+                cut.addresses,
+                self.port,
+                timeout=self.timeout,
+                retries=self.retries,
+                payload_size=self.payload_size,
+                metrics=self.metrics,
+                pacer=self.pacer,
+            )
+            self.__resolvers[key] = resolver
+
+        return resolver
+
+    @staticmethod
+    def __get_referral(
+        response: Packet, zone: str, qname: str
+    ) -> tuple[str | None, list[str], int]:
+        child = None
+        nameservers = []
+        ttl = 0
+        for record in response.authoritative_records:
+            if record.data_type != RecordType.NS.value:
+                continue
+
+            owner = normalize(record.name)
+            # only follow referrals that move strictly down towards the name
+            if owner == zone or not is_subdomain(owner, zone):
+                continue
+            if not is_subdomain(qname, owner):
+                continue
+
+            if child is None:
+                child, ttl = owner, record.ttl
+            if owner == child:
+                nameservers.append(normalize(record.data))
+                ttl = min(ttl, record.ttl)
+
+        return child, nameservers, ttl
+
+    def __get_glue(
+        self, response: Packet, nameservers: list[str], zone: str
+    ) -> list[str]:
+        # only addresses within the zone of the server that sent them are
+        # trusted (its bailiwick); the others are cached for every later
+        # lookup and would let one zone's servers redirect another zone
+        glue: dict[str, list[str]] = {}
+        ttls: dict[str, int] = {}
+        for record in response.additional_records:
+            owner = normalize(record.name)
+            if (
+                record.data_type == RecordType.A.value
+                and owner in nameservers
+                and is_subdomain(owner, zone)
+            ):
+                glue.setdefault(owner, []).append(record.data)
+                ttls[owner] = min(ttls.get(owner, record.ttl), record.ttl)
+
+        for nameserver, addresses in glue.items():
+            self.delegations.add_addresses(nameserver, addresses, ttls[nameserver])
+
+        addresses = []
+        for nameserver in nameservers:
+            addresses.extend(
+                glue.get(nameserver) or self.delegations.get_addresses(nameserver)
+            )
+        return addresses
+
+    async def __resolve_nameservers(self, nameservers: list[str], depth: int) -> list[str]:
+        if depth >= 4:
+            return []
+
+        for nameserver in nameservers:
+            try:
+                response, _ = await self.__resolve_once(nameserver, False, False, depth + 1)
+            except DnsError:
+                continue
+
+            records = [a for a in response.answers if a.data_type == RecordType.A.value]
+            if records:
+                addresses = [a.data for a in records]
+                ttl = min(a.ttl for a in records)
+                self.delegations.add_addresses(nameserver, addresses, ttl)
+                return addresses
+
+        return []
@@ -0,0 +1,269 @@
+import bisect
+import json
+import math
+import sys
+import time
+from typing import Callable
+
+from dns_client.packet import RecordType
+
+# Per-query phase timings, latency histograms and counters. A resolver
+# only records when it has a Metrics attached, so the hot path pays a
+# single None check otherwise.
+
+PHASES = ("build", "pace", "send", "wait", "retry", "parse", "tcp")
+
+# histogram upper bounds in seconds, from 100us to 10s
+BUCKETS = (
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+
+def type_name(qtype: int) -> str:
+    try:
+        return RecordType(qtype).name
+    except ValueError:
+        return f"TYPE{qtype}"
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...] = BUCKETS):
+        self.bounds = bounds
+        # one count per bucket, plus one for values above the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p: float) -> float | None:
+        # upper bound of the bucket holding the p-th observation; values
+        # past the last bound report that bound
+        if not self.count:
+            return None
+
+        rank = max(1, math.ceil(p * self.count))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return self.bounds[-1]
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        buckets = []
+        seen = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            seen += count
+            buckets.append((bound, seen))
+        return buckets
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": {
+                "+Inf" if math.isinf(bound) else repr(bound): count
+                for bound, count in self.cumulative()
+            },
+        }
+
+
+class QueryTrace:
+    # timings of one upstream query, handed to Metrics.record and then to
+    # every subscribed hook
+    __slots__ = (
+        "metrics",
+        "name",
+        "qtype",
+        "server",
+        "rcode",
+        "retries",
+        "truncated",
+        "timed_out",
+        "start",
+        "elapsed",
+        "build",
+        "pace",
+        "send",
+        "wait",
+        "retry",
+        "parse",
+        "tcp",
+    )
+
+    def __init__(self, metrics: "Metrics", name: str, qtype: int = 0):
+        self.metrics = metrics
+        self.name = name
+        self.qtype = qtype
+        self.server: str | None = None
+        self.rcode: int | None = None
+        self.retries = 0
+        self.truncated = False
+        self.timed_out = False
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        self.build = 0.0
+        self.pace = 0.0
+        self.send = 0.0
+        self.wait = 0.0
+        self.retry = 0.0
+        self.parse = 0.0
+        self.tcp = 0.0
+
+    def finish(self) -> None:
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.record(self)
+
+    def phases(self) -> dict[str, float]:
+        return {phase: getattr(self, phase) for phase in PHASES}
+
+
+class Metrics:
+    def __init__(self, bounds: tuple[float, ...] = BUCKETS):
+        self.bounds = bounds
+        # (server, qtype) -> latency of answered queries
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.phases = {phase: Histogram(bounds) for phase in PHASES}
+        # (name, sorted label pairs) -> value
+        self.counters: dict[tuple[str, tuple], int] = {}
+        self.__hooks: list[Callable[[QueryTrace], None]] = []
+
+    def subscribe(self, hook: Callable[[QueryTrace], None]) -> Callable[[QueryTrace], None]:
+        self.__hooks.append(hook)
+        return hook
+
+    def unsubscribe(self, hook: Callable[[QueryTrace], None]) -> None:
+        self.__hooks.remove(hook)
+
+    def trace(self, name: str, qtype: int = 0) -> QueryTrace:
+        return QueryTrace(self, name, qtype)
+
+    def count(self, name: str, value: int = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def get(self, name: str, **labels: str) -> int:
+        # sum of every series of a counter matching the given labels
+        wanted = set(labels.items())
+        return sum(
+            value
+            for (counter, series), value in self.counters.items()
+            if counter == name and wanted <= set(series)
+        )
+
+    def record(self, trace: QueryTrace) -> None:
+        qtype = type_name(trace.qtype)
+        if trace.timed_out:
+            self.count("failures", qtype=qtype)
+        else:
+            server = trace.server or ""
+            histogram = self.latency.get((server, qtype))
+            if histogram is None:
+                histogram = self.latency[(server, qtype)] = Histogram(self.bounds)
+            histogram.observe(trace.elapsed)
+            self.count("responses", server=server, qtype=qtype, rcode=str(trace.rcode))
+            if trace.truncated:
+                self.count("truncated", server=server)
+
+        if trace.retries:
+            self.count("retries", trace.retries, qtype=qtype)
+        for phase, histogram in self.phases.items():
+            value = getattr(trace, phase)
+            if value:
+                histogram.observe(value)
+
+        for hook in self.__hooks:
+            hook(trace)
+
+    def snapshot(self) -> dict:
+        counters: dict[str, list[dict]] = {}
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+
+        return {
+            "counters": counters,
+            "latency": [
+                {"server": server, "qtype": qtype, **histogram.to_dict()}
+                for (server, qtype), histogram in sorted(self.latency.items())
+            ],
+            "phases": {
+                phase: histogram.to_dict()
+                for phase, histogram in self.phases.items()
+                if histogram.count
+            },
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "dns_client") -> str:
+        lines: list[str] = []
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f"{prefix}_{name}_total{_labels(dict(labels))} {value}")
+
+        if self.latency:
+            lines.append(f"# TYPE {prefix}_query_seconds histogram")
+            for (server, qtype), histogram in sorted(self.latency.items()):
+                lines.extend(
+                    _histogram_lines(
+                        f"{prefix}_query_seconds", {"server": server, "qtype": qtype}, histogram
+                    )
+                )
+
+        phases = [(p, h) for p, h in self.phases.items() if h.count]
+        if phases:
+            lines.append(f"# TYPE {prefix}_phase_seconds histogram")
+            for phase, histogram in phases:
+                lines.extend(
+                    _histogram_lines(f"{prefix}_phase_seconds", {"phase": phase}, histogram)
+                )
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        # JSON for a .json path, Prometheus text otherwise; '-' is stderr
+        text = self.to_json() + "\n" if path.endswith(".json") else self.to_prometheus()
+        if path == "-":
+            sys.stderr.write(text)
+            return
+
+        with open(path, "w") as f:
+            f.write(text)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, labels: dict[str, str], histogram: Histogram) -> list[str]:
+    lines = []
+    for bound, count in histogram.cumulative():
+        le = "+Inf" if math.isinf(bound) else repr(bound)
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {count}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum!r}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
@@ -0,0 +1,194 @@
+import csv
+import io
+import json
+import sys
+from typing import IO, Iterable
+
+from dns_client import presentation
+from dns_client.errors import DnsError, NameNotFoundError
+from dns_client.result import Resolution
+from dns_client.tcp import frame
+
+
+class OutputFormat:
+    binary = False
+    empty: str | bytes = ""
+
+    def header(self) -> str | bytes:
+        return self.empty
+
+    def format_resolution(self, resolution: Resolution) -> str | bytes:
+        raise NotImplementedError
+
+    def format_error(self, name: str, error: DnsError) -> str | bytes:
+        raise NotImplementedError
+
+    def join(self, chunks: Iterable[str | bytes]) -> str | bytes:
+        return self.empty.join(chunks)
+
+
+class TextFormat(OutputFormat):
+    def format_resolution(self, resolution: Resolution) -> str:
+        return presentation.format_bulk(resolution)
+
+    def format_error(self, name: str, error: DnsError) -> str:
+        return presentation.format_bulk_error(name, error)
+
+
+class JsonLinesFormat(OutputFormat):
+    def __init__(self):
+        self.encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def format_resolution(self, resolution: Resolution) -> str:
+        answers = [
+            {
+                "name": record.name,
+                "type": record.get_type_str(),
+                "ttl": record.ttl,
+                "data": record.data,
+                "preference": record.preference,
+            }
+            for record in resolution.get_records("answers")
+        ]
+        line = {
+            "name": resolution.name,
+            "type": resolution.qtype.to_str(),
+            "rcode": resolution.response_code,
+            "authoritative": resolution.authoritative,
+            "cached": resolution.cached,
+            "elapsed": round(resolution.elapsed, 6),
+            "retries": resolution.retries,
+            "answers": answers,
+        }
+        return self.encoder.encode(line) + "\n"
+
+    def format_error(self, name: str, error: DnsError) -> str:
+        line = {
+            "name": name,
+            "error": type(error).__name__,
+            "rcode": getattr(error, "response_code", None),
+            "message": str(error),
+        }
+        return self.encoder.encode(line) + "\n"
+
+
+class CsvFormat(OutputFormat):
+    COLUMNS = ["name", "status", "type", "data", "preference", "ttl", "authoritative"]
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+
+    def header(self) -> str:
+        return self.__flush([self.COLUMNS])
+
+    def format_resolution(self, resolution: Resolution) -> str:
+        records = resolution.get_records("answers")
+        if not records:
+            return self.__flush([[resolution.name, "NOTFOUND", "", "", "", "", ""]])
+
+        isAuth = "auth" if resolution.authoritative else "nonauth"
+        return self.__flush(
+            [
+                resolution.name,
+                "OK",
+                record.get_type_str(),
+                record.data,
+                record.preference,
+                record.ttl,
+                isAuth,
+            ]
+            for record in records
+        )
+
+    def format_error(self, name: str, error: DnsError) -> str:
+        status = "NOTFOUND" if isinstance(error, NameNotFoundError) else "ERROR"
+        return self.__flush([[name, status, "", str(error), "", "", ""]])
+
+    def __flush(self, rows: Iterable[list]) -> str:
+        self.writer.writerows(rows)
+        out = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return out
+
+
+class BinaryFormat(OutputFormat):
+    # each response as received, with a two-byte length prefix (the same
+    # framing as DNS over TCP); queries that failed without a usable
+    # response are not written
+    binary = True
+    empty = b""
+
+    def format_resolution(self, resolution: Resolution) -> bytes:
+        wire = resolution.packet.wire
+        if wire is None:
+            return b""
+
+        return frame(bytes(wire))
+
+    def format_error(self, name: str, error: DnsError) -> bytes:
+        return b""
+
+
+FORMATS: dict[str, type[OutputFormat]] = {
+    "text": TextFormat,
+    "jsonl": JsonLinesFormat,
+    "csv": CsvFormat,
+    "binary": BinaryFormat,
+}
+
+
+def get_format(name: str) -> OutputFormat:
+    try:
+        return FORMATS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown output format {name!r}") from None
+
+
+class OutputSink:
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(
+        self,
+        format: OutputFormat,
+        stream: IO | None = None,
+        buffer_size: int = BUFFER_SIZE,
+    ):
+        if stream is None:
+            stream = sys.stdout.buffer if format.binary else sys.stdout
+
+        self.format = format
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.__chunks: list[str | bytes] = []
+        self.__size = 0
+        self.write(format.header())
+
+    def write(self, chunk: str | bytes) -> None:
+        if not chunk:
+            return
+
+        self.__chunks.append(chunk)
+        self.__size += len(chunk)
+        if self.__size >= self.buffer_size:
+            self.flush()
+
+    def write_resolution(self, resolution: Resolution) -> None:
+        self.write(self.format.format_resolution(resolution))
+
+    def write_error(self, name: str, error: DnsError) -> None:
+        self.write(self.format.format_error(name, error))
+
+    def flush(self) -> None:
+        if self.__chunks:
+            self.stream.write(self.format.join(self.__chunks))
+            self.__chunks.clear()
+            self.__size = 0
+        self.stream.flush()
+
+    def __enter__(self) -> "OutputSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    # Allows `rate` sends per second with bursts of up to `burst`. reserve()
+    # always takes a token and returns how long the caller must wait for it;
+    # tokens may go negative, so concurrent callers queue up in order.
+    __slots__ = ("rate", "burst", "tokens", "updated", "clock")
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = self.burst
+        self.clock = clock
+        self.updated = clock()
+
+    def __refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        self.__refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def try_take(self) -> bool:
+        self.__refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _ServerPace:
+    __slots__ = ("bucket", "slots", "completed", "timeouts", "epoch")
+
+    def __init__(self, bucket: TokenBucket, slots: asyncio.Semaphore | None):
+        self.bucket = bucket
+        self.slots = slots
+        self.completed = 0
+        self.timeouts = 0
+        # bumped on every decrease; outcomes of earlier sends are ignored
+        self.epoch = 0
+
+
+class SendScheduler:
+    # Paces the transmissions of a resolver per server: a token bucket
+    # limits the send rate, an optional cap limits the queries awaiting an
+    # answer, and the rate follows AIMD. After every `window` answered or
+    # timed out transmissions to a server, its rate is multiplied by
+    # `decrease` if more than `threshold` of them timed out, and otherwise
+    # raised by `increase`, up to the configured rate. Only transmissions
+    # sent after the last decrease count, so timeouts from a burst that was
+    # already backed off from do not cut the rate again (as TCP does once
+    # per window).
+    def __init__(
+        self,
+        rate: float,
+        burst: float | None = None,
+        max_outstanding: int | None = None,
+        window: int = 50,
+        threshold: float = 0.05,
+        decrease: float = 0.5,
+        increase: float | None = None,
+        min_rate: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_outstanding = max_outstanding
+        self.window = window
+        self.threshold = threshold
+        self.decrease = decrease
+        self.increase = increase if increase is not None else max(1.0, rate / 20)
+        self.min_rate = min(min_rate, rate)
+        self.clock = clock
+        self.decreases = 0
+        self.increases = 0
+        self.__servers: dict[str, _ServerPace] = {}
+
+    def __state(self, server: str) -> _ServerPace:
+        state = self.__servers.get(server)
+        if state is None:
+            slots = None
+            if self.max_outstanding is not None:
+                slots = asyncio.Semaphore(self.max_outstanding)
+            state = _ServerPace(TokenBucket(self.rate, self.burst, self.clock), slots)
+            self.__servers[server] = state
+        return state
+
+    def get_rate(self, server: str) -> float:
+        state = self.__servers.get(server)
+        return state.bucket.rate if state is not None else self.rate
+
+    async def acquire(self, server: str) -> int:
+        # returns the ticket to hand back to release()
+        state = self.__state(server)
+        if state.slots is not None:
+            await state.slots.acquire()
+
+        # a send paced at a rate that has since been cut still counts as
+        # sent before the cut
+        epoch = state.epoch
+        delay = state.bucket.reserve()
+        if delay <= 0:
+            return epoch
+
+        try:
+            await asyncio.sleep(delay)
+        except BaseException:
+            if state.slots is not None:
+                state.slots.release()
+            raise
+        return epoch
+
+    def release(self, server: str, timed_out: bool = False, ticket: int | None = None) -> None:
+        state = self.__state(server)
+        if state.slots is not None:
+            state.slots.release()
+        if ticket is not None and ticket != state.epoch:
+            return
+
+        state.completed += 1
+        state.timeouts += timed_out
+        if state.completed < self.window:
+            return
+
+        bucket = state.bucket
+        if state.timeouts > self.threshold * state.completed:
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            state.epoch += 1
+            self.decreases += 1
+        elif bucket.rate < self.rate:
+            bucket.rate = min(self.rate, bucket.rate + self.increase)
+            self.increases += 1
+        state.completed = 0
+        state.timeouts = 0
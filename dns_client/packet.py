@@ -1,9 +1,36 @@
+import enum
+import functools
 import random
+import socket
 import struct
-import enum
+from typing import Callable
+
+from dns_client.errors import (
+    RESPONSE_ERRORS,
+    MalformedPacketError,
+    RecursionNotAvailableError,
+    ResponseError,
+    UnexpectedClassError,
+)
 
 
 class PacketHeader:
+    __slots__ = (
+        "id",
+        "response",
+        "opcode",
+        "authoritative",
+        "truncated",
+        "recursive",
+        "recursive_supported",
+        "response_code",
+        "question_count",
+        "answer_count",
+        "authoritative_records_count",
+        "additional_records_count",
+        "z",
+    )
+
     def __init__(
         self,
         id: int,
@@ -45,16 +72,18 @@ class PacketHeader:
         )
 
     @classmethod
-    def build_request(cls, question_count: int):
+    def build_request(cls, question_count: int, recursive: bool = True):
         return cls(
             id=cls.__generate_id(),
-            recursive=True,
+            recursive=recursive,
             question_count=question_count,
         )
 
     @classmethod
-    def build_response(cls, header: bytes):
-        id, flag, qcount, acount, nscount, arcount = struct.unpack("!HHHHHH", header)
+    def build_response(cls, header: bytes | memoryview, offset: int = 0):
+        id, flag, qcount, acount, nscount, arcount = struct.unpack_from(
+            "!HHHHHH", header, offset
+        )
         h = PacketHeader(
             id=id,
             question_count=qcount,
@@ -88,96 +117,78 @@ class PacketHeader:
         return flag
 
     def _unpack_flag(self, flag: int) -> None:
-        def mask(position: int, m: int) -> int:
-            return (flag >> position) & m
-
-        qr = mask(15, 0x01)
-        opcode = mask(11, 0x0F)
-        aa = mask(10, 0x01)
-        tc = mask(9, 0x01)
-        rd = mask(8, 0x01)
-        ra = mask(7, 0x01)
-        z = mask(4, 0x07)
-        rcode = mask(0, 0x0F)
-
-        self.response = self.__from_bit(qr)
-        self.opcode = opcode
-        self.authoritative = self.__from_bit(aa)
-        self.truncated = self.__from_bit(tc)
-        self.recursive = self.__from_bit(rd)
-        self.recursive_supported = self.__from_bit(ra)
-        self.z = z
-        self.response_code = rcode
-
-    def validateHeaderErrors(self) -> None:
-        if not self.recursive_supported:
-            print(
-                "ERROR \t Not recursive: the name server does not support recursive queries"
+        self.response = bool(flag & 0x8000)
+        self.opcode = (flag >> 11) & 0x0F
+        self.authoritative = bool(flag & 0x0400)
+        self.truncated = bool(flag & 0x0200)
+        self.recursive = bool(flag & 0x0100)
+        self.recursive_supported = bool(flag & 0x0080)
+        self.z = (flag >> 4) & 0x07
+        self.response_code = flag & 0x0F
+
+    ERRORS = {
+        1: "Format error: the name server was unable to interpret the query",
+        2: "Server failure: the name server was unable to process this query due to a problem with the name server",
+        3: "Name error: the domain name referenced in the query does not exist",
+        4: "Not implemented: the name server does not support the requested kind of query",
+        5: "Refused: the name server refuses to perform the requested operation for policy reasons",
+    }
+
+    def get_error(self, recursive: bool = True) -> ResponseError | None:
+        if recursive and not self.recursive_supported:
+            return RecursionNotAvailableError(
+                "Not recursive: the name server does not support recursive queries",
+                self.response_code,
             )
-            exit(1)
 
         if self.response_code == 0:
-            return
-
-        errors = {
-            1: "ERROR \t Format error: the name server was unable to interpret the query",
-            2: "ERROR \t Server failure: the name server was unable to process this query due to a problem with the name server",
-            3: "NOTFOUND \t Name error: the domain name referenced in the query does not exist",
-            4: "ERROR \t Not implemented: the name server does not support the requested kind of query",
-            5: "ERROR \t Refused: the name server refuses to perform the requested operation for policy reasons",
-        }
+            return None
 
-        err = errors.get(self.response_code)
-        msg = "ERROR \t Unexpected error: an unexpected error has occured"
-        if err:
-            msg = err
+        err = RESPONSE_ERRORS.get(self.response_code, ResponseError)
+        msg = self.ERRORS.get(
+            self.response_code,
+            "Unexpected error: an unexpected error has occured",
+        )
+        return err(msg, self.response_code)
 
-        print(msg)
-        exit(1)
+    def validateHeaderErrors(self, recursive: bool = True) -> None:
+        err = self.get_error(recursive)
+        if err is not None:
+            raise err
 
     @staticmethod
     def __to_bit(b: bool) -> int:
         return 1 if b else 0
 
-    @staticmethod
-    def __from_bit(b: int) -> bool:
-        return False if b == 0 else True
-
     @staticmethod
     def __generate_id() -> int:
         return random.randint(0, 65535)
 
 
 class RecordType(enum.Enum):
-    CNAME = 0x0005
-    NS = 0x0002
     A = 0x0001
+    NS = 0x0002
+    CNAME = 0x0005
+    SOA = 0x0006
+    PTR = 0x000C
     MX = 0x000F
-
-    __to_str = {
-        CNAME: "CNAME",
-        NS: "NS",
-        A: "A",
-        MX: "MX",
-    }
+    TXT = 0x0010
+    AAAA = 0x001C
+    SRV = 0x0021
 
     @classmethod
     def is_supported(cls, code: int) -> bool:
-        for c in cls:
-            if c.value == code:
-                return True
-
-        return False
+        return code in DECODERS
 
     def to_str(self) -> str:
-        s = self.__to_str.get(self.value)
-        if not s:
-            return ""
-
-        return s
+        return self.name
 
 
 class PacketQuestion:
+    __slots__ = ("name", "qtype")
+
+    qtype: "RecordType | int"
+
     QCLASS = 0x0001
 
     def __init__(self, name: str, mx: bool = False, ns: bool = False):
@@ -190,23 +201,29 @@ class PacketQuestion:
             self.qtype = RecordType.A
 
     def pack(self) -> bytes:
-        qname = self.__pack_host_name()
-        packet = qname + struct.pack("!HH", self.qtype.value, self.QCLASS)
-        return packet
+        return self.__pack(self.name, self.qtype)
 
     def get_packed_length(self) -> int:
-        return len(self.pack())
+        return len(self.__pack(self.name, self.qtype))
 
-    def __pack_host_name(self) -> bytes:
-        parts = []
-        labels = self.name.split(".")
-        for label in labels:
-            length = bytes([len(label)])
-            ascii_label = label.encode("ascii")
-            parts.append(length + ascii_label)
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def __pack(name: str, qtype: "RecordType") -> bytes:
+        return pack_name(name) + struct.pack("!HH", qtype.value, PacketQuestion.QCLASS)
 
-        parts.append(bytes([0]))
-        return b"".join(parts)
+    @classmethod
+    def read(
+        cls, names: "DecompressionTable", pointer: int
+    ) -> tuple["PacketQuestion", int]:
+        name, pointer = names.read(pointer)
+        if pointer + 4 > len(names.message):
+            raise MalformedPacketError("Question runs past the end of the message")
+
+        qtype, _ = struct.unpack_from("!HH", names.message, pointer)
+        question = cls(name)
+        # types without a RecordType member (e.g. ANY) keep their numeric code
+        question.qtype = RecordType(qtype) if RecordType.is_supported(qtype) else qtype
+        return question, pointer + 4
 
     @classmethod
     def build_question(cls, question: bytes):
@@ -214,14 +231,191 @@ class PacketQuestion:
         name = data.decode()
 
         end = question[-4:]
-        qtype, _ = struct.unpack("HH", end)
+        qtype, _ = struct.unpack("!HH", end)
         mx = qtype == RecordType.MX.value
         ns = qtype == RecordType.NS.value
 
         return PacketQuestion(name=name, mx=mx, ns=ns)
 
 
+# label bytes that stand for themselves in presentation format; labels may
+# hold any byte (RFC 2181), the others are escaped as in RFC 1035 master files
+_PLAIN_LABEL_BYTES = bytes(b for b in range(0x21, 0x7F) if b not in b".\\")
+
+
+def escape_label(label: bytes) -> str:
+    text = []
+    for b in label:
+        if b in _PLAIN_LABEL_BYTES:
+            text.append(chr(b))
+        elif b in b".\\":
+            text.append("\\" + chr(b))
+        else:
+            text.append("\\%03d" % b)
+    return "".join(text)
+
+
+def unescape_name(name: str) -> list[bytes]:
+    # the labels of a presentation format name, undoing escape_label
+    labels = []
+    label = bytearray()
+    i = 0
+    while i < len(name):
+        c = name[i]
+        if c == ".":
+            labels.append(bytes(label))
+            label.clear()
+        elif c != "\\":
+            label += c.encode("ascii")
+        elif name[i + 1 : i + 4].isdigit() and len(name[i + 1 : i + 4]) == 3:
+            label.append(int(name[i + 1 : i + 4]))
+            i += 3
+        elif i + 1 < len(name):
+            label += name[i + 1].encode("ascii")
+            i += 1
+        else:
+            raise ValueError(f"Name ends with an escape: {name!r}")
+        i += 1
+
+    labels.append(bytes(label))
+    return labels
+
+
+def pack_name(name: str) -> bytes:
+    # uncompressed wire format of a presentation format name
+    if "\\" in name:
+        labels = unescape_name(name)
+    else:
+        labels = [label.encode("ascii") for label in name.split(".")]
+    # a trailing dot stands for the root label, which is appended below
+    while labels and not labels[-1]:
+        labels.pop()
+
+    parts = [bytes([len(label)]) + label for label in labels]
+    parts.append(b"\x00")
+    return b"".join(parts)
+
+
+class DecompressionTable:
+    __slots__ = ("message", "names")
+
+    MAX_POINTERS = 64
+    MAX_NAME_LENGTH = 255
+
+    def __init__(self, message: bytes | memoryview):
+        if not isinstance(message, memoryview):
+            message = memoryview(message)
+
+        self.message = message
+        # offset -> (name, wire length, offset just past the name in place)
+        self.names: dict[int, tuple[str, int, int]] = {}
+
+    def read(self, start: int) -> tuple[str, int]:
+        cached = self.names.get(start)
+        if cached is not None:
+            return cached[0], cached[2]
+
+        message = self.message
+        names = self.names
+        size = len(message)
+
+        # fast path: a bare pointer to an already decoded name
+        if start + 1 < size and message[start] >= 0xC0:
+            target = names.get(((message[start] & 0x3F) << 8) | message[start + 1])
+            if target is not None:
+                names[start] = (target[0], target[1], start + 2)
+                return target[0], start + 2
+
+        # (offset, label or None for a pointer, in-place end, wire length)
+        steps: list[list] = []
+        open_steps: list[list] = []
+        length = 1
+        pointers = 0
+        offset = start
+        while True:
+            cached = names.get(offset)
+            if cached is not None:
+                suffix, suffix_length, end = cached
+                length += suffix_length - 1
+                break
+
+            if offset >= size:
+                raise MalformedPacketError("Domain name runs past the end of the message")
+
+            label_length = message[offset]
+            if label_length == 0:
+                suffix, suffix_length, end = "", 1, offset + 1
+                break
+
+            if label_length & 0xC0 == 0xC0:
+                if offset + 1 >= size:
+                    raise MalformedPacketError("Truncated compression pointer")
+
+                pointers += 1
+                if pointers > self.MAX_POINTERS:
+                    raise MalformedPacketError("Too many compression pointers")
+
+                step = [offset, None, offset + 2, 0]
+                steps.append(step)
+                for s in open_steps:
+                    s[2] = offset + 2
+                open_steps.clear()
+
+                offset = ((label_length & 0x3F) << 8) | message[offset + 1]
+                continue
+
+            if label_length & 0xC0:
+                raise MalformedPacketError("Unsupported label type")
+
+            length += label_length + 1
+            if length > self.MAX_NAME_LENGTH:
+                raise MalformedPacketError("Domain name exceeds 255 bytes")
+
+            label_end = offset + 1 + label_length
+            if label_end > size:
+                raise MalformedPacketError("Label runs past the end of the message")
+
+            label = bytes(message[offset + 1 : label_end])
+            if label.translate(None, _PLAIN_LABEL_BYTES):
+                text = escape_label(label)
+            else:
+                text = label.decode("ascii")
+            step = [offset, text, 0, label_length]
+            steps.append(step)
+            open_steps.append(step)
+            offset = label_end
+
+        for s in open_steps:
+            s[2] = end
+
+        if length > self.MAX_NAME_LENGTH:
+            raise MalformedPacketError("Domain name exceeds 255 bytes")
+
+        names[offset] = (suffix, suffix_length, end)
+        for offset, label, end, label_length in reversed(steps):
+            if label is not None:
+                suffix_length += label_length + 1
+                suffix = f"{label}.{suffix}" if suffix else label
+            names[offset] = (suffix, suffix_length, end)
+
+        name, _, end = names[start]
+        return name, end
+
+
 class PacketAnswer:
+    __slots__ = (
+        "name",
+        "data_type",
+        "clazz",
+        "ttl",
+        "data_length",
+        "_raw",
+        "_data",
+        "_preference",
+        "_names",
+        "_rdata_offset",
+    )
+
     def __init__(
         self,
         name: str,
@@ -238,110 +432,278 @@ class PacketAnswer:
         self.clazz = clazz
         self.ttl = ttl
         self.data_length = data_length
-        self.raw = raw
-        self.data = data
-        self.preference = preference
+        self._raw = raw
+        self._data = data
+        self._preference = preference
+        self._names: DecompressionTable | None = None
+        self._rdata_offset = 0
+
+    @property
+    def raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = bytes(self.rdata())
+        return self._raw
+
+    @raw.setter
+    def raw(self, raw: bytes) -> None:
+        self._raw = raw
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            self.__extract_data()
+        return self._data
+
+    @data.setter
+    def data(self, data: str) -> None:
+        self._data = data
+
+    @property
+    def preference(self) -> int:
+        if self._preference is None:
+            self.__extract_data()
+        return self._preference
+
+    @preference.setter
+    def preference(self, preference: int) -> None:
+        self._preference = preference
+
+    def rdata(self) -> memoryview:
+        if self._names is None:
+            return memoryview(self._raw)
+
+        start = self._rdata_offset
+        return self._names.message[start : start + self.data_length]
 
     def is_supported_type(self) -> bool:
         return RecordType.is_supported(self.data_type)
 
     def get_type_str(self) -> str:
-        return RecordType(self.data_type).to_str()
+        if self.data_type in DECODERS:
+            return RecordType(self.data_type).to_str()
+        return f"TYPE{self.data_type}"
 
     @classmethod
     def build_answer(
-        cls, response: bytes, pointer: int, count: int
+        cls,
+        response: bytes | memoryview,
+        pointer: int,
+        count: int,
+        names: DecompressionTable | None = None,
     ) -> tuple[list["PacketAnswer"], int]:
+        if names is None:
+            names = DecompressionTable(response)
+
         answers = []
         for _ in range(count):
-            answer, pointer = cls.__unpack_answer(response, pointer)
+            answer, pointer = cls.__unpack_answer(names, pointer)
             answers.append(answer)
-            if answer.clazz != 1:
-                print(
-                    "ERROR \t Unexpected class: an unexpected class code value in the records was encountered"
+            # the OPT pseudo-record carries the UDP payload size in its class
+            if answer.clazz != 1 and answer.data_type != PacketOpt.TYPE:
+                raise UnexpectedClassError(
+                    "Unexpected class: an unexpected class code value in the records was encountered"
                 )
-                exit(1)
 
         return answers, pointer
 
     @classmethod
     def __unpack_answer(
-        cls, response: bytes, pointer: int
+        cls, names: DecompressionTable, pointer: int
     ) -> tuple["PacketAnswer", int]:
-        name, pointer = cls.__extract_name(response, pointer)
-
+        name, pointer = names.read(pointer)
         data_start = pointer + 10
-        meta = response[pointer:data_start]
-        data_type, clazz, ttl, data_length = struct.unpack("!HHIH", meta)
+        if data_start > len(names.message):
+            raise MalformedPacketError("Record header runs past the end of the message")
+
+        data_type, clazz, ttl, data_length = struct.unpack_from(
+            "!HHIH", names.message, pointer
+        )
+        if data_start + data_length > len(names.message):
+            raise MalformedPacketError("Record data runs past the end of the message")
+        # checked here, since a bad length would only surface on first decode
+        expected = RDATA_LENGTHS.get(data_type)
+        if expected is not None and data_length != expected:
+            raise MalformedPacketError(
+                f"{RecordType(data_type).name} record data must be {expected} bytes"
+            )
 
-        data_end = data_start + data_length
         a = PacketAnswer(
             name=name,
             data_type=data_type,
             clazz=clazz,
             ttl=ttl,
             data_length=data_length,
+            raw=None,
+            data=None,
+            preference=None,
         )
 
-        a.__extract_data(response, data_start, data_end)
-
-        return a, data_end
-
-    def __extract_data(self, response: bytes, start: int, end: int):
-        self.raw = response[start:end]
-        match self.data_type:
-            case RecordType.CNAME.value:
-                self.data, _ = self.__extract_name(response, start)
-            case RecordType.NS.value:
-                self.data, _ = self.__extract_name(response, start)
-            case RecordType.A.value:
-                octets = []
-                for octet in self.raw:
-                    octets.append(str(octet))
-                self.data = ".".join(octets)
-            case RecordType.MX.value:
-                (preference,) = struct.unpack("!H", self.raw[0:2])
-                self.preference = preference
-                self.data, _ = self.__extract_name(response, start + 2)
+        # rdata stays a view into the message until raw or data is requested
+        a._names = names
+        a._rdata_offset = data_start
 
-    @classmethod
-    def __extract_name(cls, response: bytes, start: int) -> tuple[str, int]:
-        labels = []
-        out_pointer = start + 1
-        label_found = False
-        while True:
-            length = response[start]
-            if length == 0:
-                break
+        return a, data_start + data_length
 
-            if cls.__is_label_pointer(length):
-                pointer = cls.__decode_pointer(length, response[start + 1])
+    def __extract_data(self) -> None:
+        if self._names is None:
+            names, start = DecompressionTable(self._raw), 0
+        else:
+            names, start = self._names, self._rdata_offset
+
+        decoder = DECODERS.get(self.data_type, _decode_unknown)
+        try:
+            self._data, self._preference = decoder(names, start, self.data_length)
+        except struct.error:
+            raise MalformedPacketError(
+                f"Record data too short for type {self.get_type_str()}"
+            ) from None
 
-                if not label_found:
-                    out_pointer = start + 2
-                    label_found = True
 
-                start = pointer
-                continue
+# rdata decoders keyed by type code; each takes the message, the rdata
+# offset and length, and returns (data, preference)
+Decoder = Callable[[DecompressionTable, int, int], tuple[str, int]]
+DECODERS: dict[int, Decoder] = {}
 
-            label_start = start + 1
-            label = response[label_start : label_start + length]
-            label_str = label.decode("ascii")
-            labels.append(label_str)
-            start = label_start + length
+# types whose rdata has a fixed length, validated while parsing
+RDATA_LENGTHS = {RecordType.A.value: 4, RecordType.AAAA.value: 16}
 
-        return (".".join(labels), out_pointer)
 
-    @staticmethod
-    def __is_label_pointer(first_byte: int) -> bool:
-        return first_byte & 0b11000000 == 0b11000000
+def decoder(*types: RecordType) -> Callable[[Decoder], Decoder]:
+    def register(fn: Decoder) -> Decoder:
+        for t in types:
+            DECODERS[t.value] = fn
+        return fn
 
-    @staticmethod
-    def __decode_pointer(first_byte: int, second_byte: int) -> int:
-        return ((first_byte & 0x3F) << 8) + second_byte
+    return register
+
+
+@decoder(RecordType.A)
+def _decode_a(names: DecompressionTable, start: int, length: int) -> tuple[str, int]:
+    if length != 4:
+        raise MalformedPacketError("A record data must be 4 bytes")
+    return "%d.%d.%d.%d" % tuple(names.message[start : start + 4]), 0
+
+
+@decoder(RecordType.AAAA)
+def _decode_aaaa(
+    names: DecompressionTable, start: int, length: int
+) -> tuple[str, int]:
+    if length != 16:
+        raise MalformedPacketError("AAAA record data must be 16 bytes")
+    return socket.inet_ntop(socket.AF_INET6, names.message[start : start + 16]), 0
+
+
+@decoder(RecordType.CNAME, RecordType.NS, RecordType.PTR)
+def _decode_name(
+    names: DecompressionTable, start: int, length: int
+) -> tuple[str, int]:
+    return names.read(start)[0], 0
+
+
+@decoder(RecordType.MX)
+def _decode_mx(names: DecompressionTable, start: int, length: int) -> tuple[str, int]:
+    (preference,) = struct.unpack_from("!H", names.message, start)
+    return names.read(start + 2)[0], preference
+
+
+@decoder(RecordType.SRV)
+def _decode_srv(
+    names: DecompressionTable, start: int, length: int
+) -> tuple[str, int]:
+    priority, weight, port = struct.unpack_from("!HHH", names.message, start)
+    target, _ = names.read(start + 6)
+    return f"{weight} {port} {target}", priority
+
+
+@decoder(RecordType.SOA)
+def _decode_soa(
+    names: DecompressionTable, start: int, length: int
+) -> tuple[str, int]:
+    mname, pointer = names.read(start)
+    rname, pointer = names.read(pointer)
+    if pointer + 20 > start + length:
+        raise MalformedPacketError("SOA record data too short")
+    serial, refresh, retry, expire, minimum = struct.unpack_from(
+        "!IIIII", names.message, pointer
+    )
+    return f"{mname} {rname} {serial} {refresh} {retry} {expire} {minimum}", 0
+
+
+@decoder(RecordType.TXT)
+def _decode_txt(names: DecompressionTable, start: int, length: int) -> tuple[str, int]:
+    message = names.message
+    end = start + length
+    strings = []
+    while start < end:
+        string_end = start + 1 + message[start]
+        if string_end > end:
+            raise MalformedPacketError("TXT string runs past the end of the record")
+        text = str(message[start + 1 : string_end], "utf-8", "backslashreplace")
+        strings.append('"%s"' % text.replace("\\", "\\\\").replace('"', '\\"'))
+        start = string_end
+    return " ".join(strings), 0
+
+
+def _decode_unknown(
+    names: DecompressionTable, start: int, length: int
+) -> tuple[str, int]:
+    # RFC 3597 generic presentation for types without a decoder
+    return f"\\# {length} {names.message[start : start + length].hex()}", 0
+
+
+class PacketOpt:
+    __slots__ = ("payload_size", "extended_rcode", "version", "dnssec_ok", "options")
+
+    TYPE = 0x0029
+    DEFAULT_PAYLOAD_SIZE = 1232
+
+    def __init__(
+        self,
+        payload_size: int = DEFAULT_PAYLOAD_SIZE,
+        extended_rcode: int = 0,
+        version: int = 0,
+        dnssec_ok: bool = False,
+        options: bytes = b"",
+    ):
+        self.payload_size = payload_size
+        self.extended_rcode = extended_rcode
+        self.version = version
+        self.dnssec_ok = dnssec_ok
+        self.options = options
+
+    def pack(self) -> bytes:
+        ttl = (self.extended_rcode << 24) | (self.version << 16)
+        if self.dnssec_ok:
+            ttl |= 0x8000
+
+        return (
+            b"\x00"
+            + struct.pack("!HHIH", self.TYPE, self.payload_size, ttl, len(self.options))
+            + self.options
+        )
+
+    @classmethod
+    def build_opt(cls, record: "PacketAnswer") -> "PacketOpt":
+        return cls(
+            payload_size=record.clazz,
+            extended_rcode=record.ttl >> 24,
+            version=(record.ttl >> 16) & 0xFF,
+            dnssec_ok=bool(record.ttl & 0x8000),
+            options=record.raw,
+        )
 
 
 class Packet:
+    __slots__ = (
+        "header",
+        "question",
+        "answers",
+        "authoritative_records",
+        "additional_records",
+        "wire",
+        "edns",
+    )
+
     def __init__(
         self,
         header: PacketHeader,
@@ -349,57 +711,123 @@ class Packet:
         answers: list[PacketAnswer] = [],
         authoritative_records: list[PacketAnswer] = [],
         additional_records: list[PacketAnswer] = [],
+        edns: PacketOpt | None = None,
     ):
         self.header = header
         self.question = question
         self.answers = answers
         self.authoritative_records = authoritative_records
         self.additional_records = additional_records
+        self.wire: bytes | bytearray | None = None
+        self.edns = edns
+
+    def pack(self) -> bytearray:
+        # the wire buffer is built once and reused for retransmissions;
+        # only the transaction id is patched on later calls
+        if self.wire is None:
+            self.wire = bytearray(self.header.pack() + self.question.pack())
+            if self.edns is not None:
+                self.wire += self.edns.pack()
+        else:
+            struct.pack_into("!H", self.wire, 0, self.header.id)
 
-    def pack(self) -> bytes:
-        return b"".join([self.header.pack(), self.question.pack()])
+        return self.wire
+
+    def set_id(self, id: int) -> None:
+        self.header.id = id
+        if self.wire is not None:
+            struct.pack_into("!H", self.wire, 0, id)
 
     def get_records(self, record_section: str) -> list[PacketAnswer]:
-        out = []
         record_list: list[PacketAnswer] = getattr(self, record_section, [])
-        for a in record_list:
-            if a.is_supported_type():
-                out.append(a)
-        return out
+        return [a for a in record_list if a.data_type in DECODERS]
 
     @staticmethod
     def build_request(
         name: str,
         mx: bool = False,
         ns: bool = False,
+        payload_size: int | None = None,
+        recursive: bool = True,
     ) -> "Packet":
-        header = PacketHeader.build_request(1)
+        header = PacketHeader.build_request(1, recursive)
         question = PacketQuestion(name, mx, ns)
-        return Packet(header=header, question=question)
+        edns = None
+        if payload_size:
+            header.additional_records_count = 1
+            edns = PacketOpt(payload_size)
+
+        packet = Packet(header=header, question=question, edns=edns)
+        packet.wire = bytearray(
+            Packet.__build_template(name, mx, ns, payload_size, recursive)
+        )
+        struct.pack_into("!H", packet.wire, 0, header.id)
+        return packet
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def __build_template(
+        name: str, mx: bool, ns: bool, payload_size: int | None, recursive: bool
+    ) -> bytes:
+        header = PacketHeader.build_request(1, recursive)
+        header.id = 0
+        body = PacketQuestion(name, mx, ns).pack()
+        if payload_size:
+            header.additional_records_count = 1
+            body += PacketOpt(payload_size).pack()
+
+        return header.pack() + body
+
+    @staticmethod
+    def build_response(
+        raw: bytes, request: "Packet", validate: bool = True
+    ) -> "Packet":
+        # the question is read from the message itself; the request is only
+        # needed by callers that match replies to queries
+        return Packet.parse(raw, validate)
 
     @staticmethod
-    def build_response(raw: bytes, request: "Packet") -> "Packet":
-        question_pointer = 12
-        answer_pointer = question_pointer + request.question.get_packed_length()
-        header = PacketHeader.build_response(raw[:question_pointer])
-        header.validateHeaderErrors()
+    def parse(raw: bytes | memoryview, validate: bool = False) -> "Packet":
+        if len(raw) < 12:
+            raise MalformedPacketError("Message is shorter than a DNS header")
+
+        names = DecompressionTable(raw)
+        header = PacketHeader.build_response(names.message)
+        if validate:
+            header.validateHeaderErrors()
+
+        q = None
+        next_pointer = 12
+        for _ in range(header.question_count):
+            question, next_pointer = PacketQuestion.read(names, next_pointer)
+            q = q or question
 
-        q = PacketQuestion.build_question(raw[question_pointer:answer_pointer])
         answers, next_pointer = PacketAnswer.build_answer(
-            raw, answer_pointer, header.answer_count
+            raw, next_pointer, header.answer_count, names
         )
 
         authoritative_records, next_pointer = PacketAnswer.build_answer(
-            raw, next_pointer, header.authoritative_records_count
+            raw, next_pointer, header.authoritative_records_count, names
         )
 
         additional_records, _ = PacketAnswer.build_answer(
-            raw, next_pointer, header.additional_records_count
+            raw, next_pointer, header.additional_records_count, names
         )
-        return Packet(
+
+        edns = None
+        for i, record in enumerate(additional_records):
+            if record.data_type == PacketOpt.TYPE:
+                edns = PacketOpt.build_opt(additional_records.pop(i))
+                break
+
+        packet = Packet(
             header=header,
             question=q,
             answers=answers,
             authoritative_records=authoritative_records,
             additional_records=additional_records,
+            edns=edns,
         )
+        # keep the message as received, for raw output and re-framing
+        packet.wire = raw
+        return packet
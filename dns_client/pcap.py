@@ -0,0 +1,388 @@
+import argparse
+import mmap
+import socket
+import struct
+import sys
+import time
+from typing import Iterator
+
+from dns_client.errors import MalformedPacketError
+from dns_client.packet import Packet
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SECTION = b"\x0a\x0d\x0d\x0a"
+# smallest total length of the blocks read: interface description,
+# simple packet and enhanced packet
+PCAPNG_MIN_LENGTHS = {1: 20, 3: 16, 6: 32}
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8)
+
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+DNS_PORT = 53
+
+
+class CaptureError(MalformedPacketError):
+    pass
+
+
+class CapturedMessage:
+    __slots__ = ("timestamp", "source", "destination", "transport", "wire", "_packet")
+
+    def __init__(
+        self,
+        timestamp: float,
+        source: tuple[str, int],
+        destination: tuple[str, int],
+        transport: str,
+        wire: bytes,
+    ):
+        self.timestamp = timestamp
+        self.source = source
+        self.destination = destination
+        self.transport = transport
+        self.wire = wire
+        self._packet: Packet | None = None
+
+    @property
+    def packet(self) -> Packet:
+        # parsed on first access; raises MalformedPacketError
+        if self._packet is None:
+            self._packet = Packet.parse(self.wire)
+        return self._packet
+
+
+class CaptureReader:
+    # Walks a pcap or pcapng file through a read-only memory map and yields
+    # the DNS messages (UDP or TCP, port 53) it finds. Only the current
+    # message is copied out of the map, so memory use does not grow with
+    # the size of the capture. TCP messages split across segments are not
+    # reassembled.
+    RELEASE_INTERVAL = 16 << 20
+
+    def __init__(self, path: str, port: int = DNS_PORT):
+        self.path = path
+        self.port = port
+        # offset of the next unread record in the file
+        self.position = 0
+        self.frames = 0
+        self.messages = 0
+        self.skipped = 0
+
+    def __iter__(self) -> Iterator[CapturedMessage]:
+        with open(self.path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CaptureError(f"{self.path}: empty capture") from None
+
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+
+        view = memoryview(data)
+        frames = None
+        released = 0
+        try:
+            frames = self.__frames(view)
+            for timestamp, linktype, frame in frames:
+                self.frames += 1
+                yield from self.__messages(timestamp, linktype, frame)
+                if self.position - released >= self.RELEASE_INTERVAL:
+                    released = self.__release(data, released, self.position)
+        finally:
+            # every slice of the map must be gone before it can be closed
+            if frames is not None:
+                frames.close()
+            frames = frame = None
+            view.release()
+            data.close()
+
+    @staticmethod
+    def __release(data: mmap.mmap, start: int, end: int) -> int:
+        # drop pages already read so resident memory stays flat on large
+        # captures; the data is still in the page cache if needed again
+        end -= end % mmap.PAGESIZE
+        if hasattr(mmap, "MADV_DONTNEED") and end > start:
+            data.madvise(mmap.MADV_DONTNEED, start, end - start)
+        return end
+
+    def __frames(self, view: memoryview) -> Iterator[tuple[float, int, memoryview]]:
+        magic = bytes(view[:4])
+        if magic in PCAP_MAGIC:
+            return self.__pcap_frames(view, *PCAP_MAGIC[magic])
+        if magic == PCAPNG_SECTION:
+            return self.__pcapng_frames(view)
+
+        raise CaptureError(f"{self.path}: not a pcap or pcapng file")
+
+    def __pcap_frames(
+        self, view: memoryview, order: str, resolution: float
+    ) -> Iterator[tuple[float, int, memoryview]]:
+        if len(view) < 24:
+            raise CaptureError("Truncated pcap header")
+
+        (linktype,) = struct.unpack_from(order + "I", view, 20)
+        linktype &= 0xFFFF
+        record = struct.Struct(order + "IIII")
+        offset = 24
+        size = len(view)
+        while offset + 16 <= size:
+            seconds, fraction, captured, _ = record.unpack_from(view, offset)
+            offset += 16
+            if offset + captured > size:
+                break
+            self.position = offset + captured
+            yield seconds + fraction * resolution, linktype, view[offset : offset + captured]
+            offset += captured
+
+    def __pcapng_frames(self, view: memoryview) -> Iterator[tuple[float, int, memoryview]]:
+        order = "<"
+        interfaces: list[tuple[int, float]] = []
+        offset = 0
+        size = len(view)
+        while offset + 12 <= size:
+            block_type = bytes(view[offset : offset + 4])
+            if block_type == PCAPNG_SECTION:
+                # the byte-order magic decides how the rest of the section reads
+                order = "<" if bytes(view[offset + 8 : offset + 12]) == b"\x4d\x3c\x2b\x1a" else ">"
+                interfaces = []
+
+            block_type, length = struct.unpack_from(order + "II", view, offset)
+            if length < 12 or offset + length > size:
+                break
+            if length < PCAPNG_MIN_LENGTHS.get(block_type, 12):
+                raise CaptureError(f"{self.path}: truncated pcapng block at offset {offset}")
+
+            body = offset + 8
+            self.position = offset + length
+            if block_type == 1:
+                # interface description: link type, then options (if_tsresol)
+                (linktype,) = struct.unpack_from(order + "H", view, body)
+                interfaces.append((linktype, _pcapng_resolution(view, order, body + 8, offset + length - 4)))
+            elif block_type == 6:
+                interface, high, low, captured = struct.unpack_from(order + "IIII", view, body)
+                if interface < len(interfaces) and body + 20 + captured <= offset + length:
+                    linktype, resolution = interfaces[interface]
+                    timestamp = ((high << 32) | low) * resolution
+                    yield timestamp, linktype, view[body + 20 : body + 20 + captured]
+            elif block_type == 3 and interfaces:
+                # simple packet block: no timestamp, first interface
+                (original,) = struct.unpack_from(order + "I", view, body)
+                captured = min(original, length - 16)
+                yield 0.0, interfaces[0][0], view[body + 4 : body + 4 + captured]
+
+            offset += length
+
+    def __messages(
+        self, timestamp: float, linktype: int, frame: memoryview
+    ) -> Iterator[CapturedMessage]:
+        ip = _network_payload(linktype, frame)
+        if ip is None:
+            self.skipped += 1
+            return
+
+        segment = _transport_payload(ip)
+        if segment is None:
+            self.skipped += 1
+            return
+
+        protocol, source, destination, payload = segment
+        if self.port not in (source[1], destination[1]):
+            self.skipped += 1
+            return
+
+        if protocol == PROTO_UDP:
+            self.messages += 1
+            yield CapturedMessage(timestamp, source, destination, "udp", bytes(payload))
+            return
+
+        # TCP: every complete length-prefixed message in this segment
+        offset = 0
+        while offset + 2 <= len(payload):
+            (length,) = struct.unpack_from("!H", payload, offset)
+            if length < 12 or offset + 2 + length > len(payload):
+                break
+            self.messages += 1
+            wire = bytes(payload[offset + 2 : offset + 2 + length])
+            yield CapturedMessage(timestamp, source, destination, "tcp", wire)
+            offset += 2 + length
+
+
+def _pcapng_resolution(view: memoryview, order: str, offset: int, end: int) -> float:
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(order + "HH", view, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1 and offset + 5 <= end:
+            value = view[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + (length + 3) // 4 * 4
+
+    return 1e-6
+
+
+def _network_payload(linktype: int, frame: memoryview) -> memoryview | None:
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        if len(frame) < 14:
+            return None
+        (ethertype,) = struct.unpack_from("!H", frame, offset)
+        while ethertype in ETHERTYPE_VLAN and offset + 6 <= len(frame):
+            offset += 4
+            (ethertype,) = struct.unpack_from("!H", frame, offset)
+        if ethertype not in (ETHERTYPE_IPV4, ETHERTYPE_IPV6):
+            return None
+        return frame[offset + 2 :]
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        return frame[16:]
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return frame[20:]
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        return frame[4:]
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return frame
+
+    return None
+
+
+def _transport_payload(
+    ip: memoryview,
+) -> tuple[int, tuple[str, int], tuple[str, int], memoryview] | None:
+    if not ip:
+        return None
+
+    version = ip[0] >> 4
+    if version == 4:
+        if len(ip) < 20:
+            return None
+        header_length = (ip[0] & 0x0F) * 4
+        (total_length,) = struct.unpack_from("!H", ip, 2)
+        (fragment,) = struct.unpack_from("!H", ip, 6)
+        if fragment & 0x1FFF:
+            # later fragments carry no transport header
+            return None
+        protocol = ip[9]
+        source = "%d.%d.%d.%d" % tuple(ip[12:16])
+        destination = "%d.%d.%d.%d" % tuple(ip[16:20])
+        segment = ip[header_length : total_length or len(ip)]
+    elif version == 6:
+        if len(ip) < 40:
+            return None
+        # extension headers are not followed
+        protocol = ip[6]
+        source = _ipv6(ip[8:24])
+        destination = _ipv6(ip[24:40])
+        (payload_length,) = struct.unpack_from("!H", ip, 4)
+        segment = ip[40 : 40 + payload_length]
+    else:
+        return None
+
+    if protocol == PROTO_UDP and len(segment) >= 8:
+        sport, dport = struct.unpack_from("!HH", segment, 0)
+        return protocol, (source, sport), (destination, dport), segment[8:]
+
+    if protocol == PROTO_TCP and len(segment) >= 20:
+        sport, dport = struct.unpack_from("!HH", segment, 0)
+        offset = (segment[12] >> 4) * 4
+        return protocol, (source, sport), (destination, dport), segment[offset:]
+
+    return None
+
+
+def _ipv6(address: memoryview) -> str:
+    return socket.inet_ntop(socket.AF_INET6, address)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Parse the DNS messages in a pcap or pcapng capture"
+    )
+    parser.add_argument("capture", help="pcap or pcapng file")
+    parser.add_argument(
+        "-p", type=int, help="DNS port to match on either side", default=DNS_PORT
+    )
+    parser.add_argument(
+        "-v", action="store_true", help="Print one line per message"
+    )
+    args = parser.parse_args(argv)
+
+    reader = CaptureReader(args.capture, args.p)
+    parsed = malformed = records = 0
+    start = time.perf_counter()
+    try:
+        for message in reader:
+            # record data is decoded when a line is formatted, so a bad
+            # record there also marks the message malformed
+            try:
+                packet = message.packet
+                line = format_message(message) if args.v else None
+            except MalformedPacketError:
+                malformed += 1
+                continue
+
+            parsed += 1
+            records += len(packet.answers)
+            if line is not None:
+                print(line)
+    except (OSError, CaptureError) as e:
+        print(f"ERROR \t {e}", file=sys.stderr)
+        return 1
+
+    elapsed = time.perf_counter() - start
+    rate = parsed / elapsed if elapsed > 0 else 0.0
+    print(
+        f"{reader.frames} frames, {reader.messages} DNS messages "
+        f"({malformed} malformed), {records} answer records in {elapsed:.3f} seconds "
+        f"({rate:.0f} messages/s)",
+        file=sys.stderr if args.v else sys.stdout,
+    )
+    return 0
+
+
+def format_message(message: CapturedMessage) -> str:
+    packet = message.packet
+    kind = "response" if packet.header.response else "query"
+    question = packet.question
+    if question is None:
+        name, qtype = "", ""
+    else:
+        qtype = question.qtype
+        name = question.name
+        qtype = qtype.to_str() if hasattr(qtype, "to_str") else f"TYPE{qtype}"
+    answers = ", ".join(a.data for a in packet.get_records("answers"))
+    return " \t ".join(
+        [
+            "%.6f" % message.timestamp,
+            f"{message.source[0]}:{message.source[1]}",
+            f"{message.destination[0]}:{message.destination[1]}",
+            message.transport,
+            kind,
+            str(packet.header.id),
+            name,
+            qtype,
+            str(packet.header.response_code),
+            answers,
+        ]
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
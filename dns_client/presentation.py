@@ -0,0 +1,81 @@
+from dns_client.errors import DnsError, NameNotFoundError
+from dns_client.packet import PacketAnswer, RecordType
+from dns_client.result import Resolution
+
+
+def format_error(error: DnsError) -> str:
+    if isinstance(error, NameNotFoundError):
+        return f"NOTFOUND \t {error}"
+
+    return f"ERROR \t {error}"
+
+
+def format_request(name: str, qtype: RecordType, servers: list[str]) -> str:
+    return "\n".join(
+        [
+            f"DnsClient sending request for {name}",
+            f"Server: {', '.join(servers)}",
+            f"Request type:  {qtype.to_str()}",
+        ]
+    )
+
+
+def format_resolution(resolution: Resolution) -> str:
+    elapsed = "%.4f" % resolution.elapsed
+    return "\n".join(
+        [
+            f"Response received after {elapsed} seconds ({resolution.retries} retries)\n",
+            format_records(resolution, "answers", "Answer Section"),
+            "",
+            format_records(resolution, "authoritative_records", "Authoritative Section"),
+            "",
+            format_records(resolution, "additional_records", "Additional Section"),
+        ]
+    )
+
+
+def format_records(resolution: Resolution, record_section: str, title: str) -> str:
+    records = resolution.get_records(record_section)
+    count = len(records)
+    lines = [f"*** {title} ({count} records) ***"]
+    if count == 0:
+        lines.append("NOTFOUND")
+        return "\n".join(lines)
+
+    isAuth = "auth" if resolution.authoritative else "nonauth"
+    for record in records:
+        lines.append(" \t ".join(format_record(record, isAuth)))
+
+    return "\n".join(lines)
+
+
+def format_record(record: PacketAnswer, isAuth: str) -> list[str]:
+    data = [
+        record.get_type_str(),
+        str(record.data),
+        str(record.ttl),
+        isAuth,
+    ]
+
+    if record.data_type in (RecordType.MX.value, RecordType.SRV.value):
+        data.insert(2, str(record.preference))
+
+    return data
+
+
+def format_bulk(resolution: Resolution) -> str:
+    records = resolution.get_records("answers")
+    if not records:
+        return f"{resolution.name} \t NOTFOUND\n"
+
+    isAuth = "auth" if resolution.authoritative else "nonauth"
+    lines = []
+    for record in records:
+        lines.append(" \t ".join([resolution.name] + format_record(record, isAuth)))
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+def format_bulk_error(name: str, error: DnsError) -> str:
+    return f"{name} \t {format_error(error)}\n"
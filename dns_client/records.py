@@ -0,0 +1,84 @@
+import sys
+from array import array
+from typing import Iterable, Iterator
+
+from dns_client.packet import PacketAnswer, RecordType
+
+
+class RecordSet:
+    __slots__ = (
+        "names",
+        "types",
+        "classes",
+        "ttls",
+        "lengths",
+        "addresses",
+        "extra",
+    )
+
+    def __init__(self, records: Iterable[PacketAnswer] = ()):
+        self.names: list[str] = []
+        self.types = array("H")
+        self.classes = array("H")
+        # "I" is 32 bits on every supported platform, "L" is 64 on most
+        self.ttls = array("I")
+        self.lengths = array("H")
+        # IPv4 rdata packed as integers; 0 for rows that are not A records
+        self.addresses = array("I")
+        # row -> (data, preference, rdata) for every non-A row
+        self.extra: dict[int, tuple[str, int, bytes]] = {}
+        self.extend(records)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[PacketAnswer]:
+        for i in range(len(self.names)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> PacketAnswer:
+        if i < 0:
+            i += len(self.names)
+
+        data_type = self.types[i]
+        if i in self.extra:
+            data, preference, raw = self.extra[i]
+        else:
+            raw = self.addresses[i].to_bytes(4, "big")
+            data = "%d.%d.%d.%d" % tuple(raw)
+            preference = 0
+
+        return PacketAnswer(
+            name=self.names[i],
+            data_type=data_type,
+            clazz=self.classes[i],
+            ttl=self.ttls[i],
+            data_length=self.lengths[i],
+            raw=raw,
+            data=data,
+            preference=preference,
+        )
+
+    def append(self, record: PacketAnswer) -> None:
+        row = len(self.names)
+        self.names.append(sys.intern(record.name))
+        self.types.append(record.data_type)
+        self.classes.append(record.clazz)
+        self.ttls.append(record.ttl)
+        self.lengths.append(record.data_length)
+
+        if record.data_type == RecordType.A.value and record.data_length == 4:
+            self.addresses.append(int.from_bytes(record.rdata(), "big"))
+        else:
+            self.addresses.append(0)
+            self.extra[row] = (record.data, record.preference, record.raw)
+
+    def extend(self, records: Iterable[PacketAnswer]) -> None:
+        for record in records:
+            self.append(record)
+
+    def get_address(self, i: int) -> str | None:
+        if i in self.extra:
+            return None
+
+        return "%d.%d.%d.%d" % tuple(self.addresses[i].to_bytes(4, "big"))
@@ -0,0 +1,408 @@
+import asyncio
+import random
+import struct
+import time
+
+from dns_client.cache import ResponseCache
+from dns_client.configuration import Configuration
+from dns_client.errors import ConnectionFailedError, DnsError, QueryTimeoutError
+from dns_client.metrics import Metrics, QueryTrace, type_name
+from dns_client.pacing import SendScheduler
+from dns_client.packet import Packet
+from dns_client.result import Resolution
+from dns_client.servers import ServerSelector, ServerStats
+from dns_client.tcp import TcpConnectionPool
+
+
+class _ResolverProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver: "AsyncResolver", server: ServerStats):
+        self.resolver = resolver
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.resolver._on_datagram(data, self.server)
+
+    def error_received(self, exc: Exception) -> None:
+        # ICMP errors (e.g. port unreachable) are left to the retry loop
+        pass
+
+
+class AsyncResolver:
+    def __init__(
+        self,
+        server: str | list[str],
+        port: int = 53,
+        timeout: float = 5,
+        retries: int = 3,
+        cache: ResponseCache | None = None,
+        payload_size: int | None = None,
+        tcp: TcpConnectionPool | None = None,
+        metrics: Metrics | None = None,
+        pacer: SendScheduler | None = None,
+    ):
+        self.servers = [server] if isinstance(server, str) else list(server)
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.selector = ServerSelector(self.servers, port, timeout)
+        self.cache = cache
+        self.payload_size = payload_size
+        self.tcp = tcp if tcp is not None else TcpConnectionPool()
+        self.metrics = metrics
+        self.pacer = pacer
+        self.hedged = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.__inflight: dict[tuple, asyncio.Future] = {}
+        self.__transports: dict[ServerStats, asyncio.DatagramTransport] = {}
+        self.__pending: dict[int, tuple[bytes, asyncio.Future]] = {}
+        self.__opening: asyncio.Future | None = None
+        self.__exchanges = 0
+
+    @classmethod
+    def from_config(cls, config: Configuration, **kwargs) -> "AsyncResolver":
+        return cls(
+            config.servers,
+            config.port,
+            timeout=config.timeout,
+            retries=config.retries,
+            payload_size=config.payload_size,
+            **kwargs,
+        )
+
+    async def open(self) -> None:
+        if self.__transports:
+            return
+
+        # the first exchanges can arrive together; they all wait on one
+        # opening task and resume together once the sockets exist
+        if self.__opening is None:
+            self.__opening = asyncio.ensure_future(self.__open())
+        opening = self.__opening
+        try:
+            await asyncio.shield(opening)
+        finally:
+            if opening.done() and self.__opening is opening:
+                self.__opening = None
+
+    async def __open(self) -> None:
+        loop = asyncio.get_running_loop()
+        transports = {}
+        try:
+            for server in self.selector.servers:
+                transports[server], _ = await loop.create_datagram_endpoint(
+                    lambda server=server: _ResolverProtocol(self, server),
+                    remote_addr=(server.address, server.port),
+                )
+        except BaseException:
+            for transport in transports.values():
+                transport.close()
+            raise
+
+        self.__transports.update(transports)
+
+    def close(self) -> None:
+        if self.__opening is not None:
+            self.__opening.cancel()
+            self.__opening = None
+        transports = list(self.__transports.values())
+        self.__transports.clear()
+        for transport in transports:
+            transport.close()
+        self.tcp.close()
+        for _, future in self.__pending.values():
+            if not future.done():
+                future.set_exception(ConnectionFailedError("Resolver closed"))
+
+    async def __aenter__(self) -> "AsyncResolver":
+        # sockets are opened by the first exchange, so lookups answered
+        # from the cache never create one
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    def in_flight(self) -> int:
+        return len(self.__pending)
+
+    def idle(self) -> bool:
+        # no exchange in progress, including ones still opening sockets,
+        # being paced or retrying over TCP
+        return not self.__exchanges
+
+    async def query(self, name: str, mx: bool = False, ns: bool = False) -> Packet:
+        response, _, _ = await self.__lookup(name, mx, ns)
+        return response
+
+    async def resolve(
+        self, name: str, mx: bool = False, ns: bool = False
+    ) -> Resolution:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response, retries, cached = await self.__lookup(name, mx, ns)
+        elapsed = loop.time() - start
+
+        response.header.validateHeaderErrors()
+        return Resolution(
+            name,
+            response.question.qtype,
+            response,
+            elapsed=elapsed,
+            retries=retries,
+            cached=cached,
+        )
+
+    async def __lookup(
+        self, name: str, mx: bool, ns: bool
+    ) -> tuple[Packet, int, bool]:
+        metrics = self.metrics
+        trace = metrics.trace(name) if metrics is not None else None
+        request = Packet.build_request(
+            name, mx=mx, ns=ns, payload_size=self.payload_size
+        )
+        qtype = request.question.qtype.value
+        if trace is not None:
+            trace.qtype = qtype
+            trace.build = time.perf_counter() - trace.start
+
+        if self.cache is not None:
+            cached, refresh = self.cache.lookup(name, qtype)
+            if metrics is not None:
+                outcome = "cache_misses" if cached is None else "cache_hits"
+                metrics.count(outcome, qtype=type_name(qtype))
+            if cached is not None:
+                if refresh:
+                    self.__refresh(name, qtype, request)
+                return cached, 0, True
+
+        # concurrent identical questions share one upstream query
+        key = ResponseCache.key(name, qtype)
+        task = self.__inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.__fetch(name, qtype, request, trace))
+            self.__inflight[key] = task
+            task.add_done_callback(lambda t: self.__forget(key, t))
+        else:
+            self.coalesced += 1
+            if metrics is not None:
+                metrics.count("coalesced", qtype=type_name(qtype))
+
+        response, retries, _ = await asyncio.shield(task)
+        return response, retries, False
+
+    async def __fetch(
+        self, name: str, qtype: int, request: Packet, trace: QueryTrace | None
+    ) -> tuple[Packet, int, bool]:
+        # the flag tells whether the cache took the response
+        response, retries = await self.exchange(request, trace)
+        stored = False
+        if self.cache is not None:
+            stored = self.cache.put(name, qtype, response)
+
+        return response, retries, stored
+
+    def __refresh(self, name: str, qtype: int, request: Packet) -> None:
+        # re-query a stale or soon to expire entry in the background; lookups
+        # keep getting the cached answer until the new one is stored, and a
+        # failed refresh leaves the old entry in place
+        key = ResponseCache.key(name, qtype)
+        if key in self.__inflight:
+            return
+
+        task = asyncio.ensure_future(self.__fetch(name, qtype, request, None))
+        self.__inflight[key] = task
+        task.add_done_callback(lambda t: self.__forget(key, t))
+        task.add_done_callback(lambda t: self.__refreshed(name, qtype, t))
+        self.refreshes += 1
+        if self.metrics is not None:
+            self.metrics.count("refreshes", qtype=type_name(qtype))
+
+    def __refreshed(self, name: str, qtype: int, task: asyncio.Future) -> None:
+        # while the upstream keeps failing or answering with an error that
+        # is not cached (SERVFAIL, REFUSED), stale hits stop re-querying it
+        if task.cancelled():
+            return
+        if task.exception() is not None or not task.result()[2]:
+            self.cache.refresh_failed(name, qtype)
+
+    def __forget(self, key: tuple, task: asyncio.Future) -> None:
+        if self.__inflight.get(key) is task:
+            del self.__inflight[key]
+        # refreshes have no awaiting caller to collect their errors
+        if not task.cancelled():
+            task.exception()
+
+    async def exchange(
+        self, request: Packet, trace: QueryTrace | None = None
+    ) -> tuple[Packet, int]:
+        self.__exchanges += 1
+        try:
+            return await self.__exchange(request, trace)
+        finally:
+            self.__exchanges -= 1
+
+    async def __exchange(
+        self, request: Packet, trace: QueryTrace | None
+    ) -> tuple[Packet, int]:
+        metrics = self.metrics
+        if trace is None and metrics is not None:
+            trace = metrics.trace(request.question.name, request.question.qtype.value)
+
+        await self.open()
+
+        id = self.__allocate_id(request.header.id)
+        request.set_id(id)
+        packet = request.pack()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # the server echoes the question section, which guards against
+        # accepting a stray reply that happens to reuse an in-flight id
+        question_end = 12 + request.question.get_packed_length()
+        self.__pending[id] = (bytes(packet[12:question_end]).lower(), future)
+
+        ranked = self.selector.ranked()
+        sends: dict[ServerStats, list[float]] = {}
+        retries = 0
+        pacer = self.pacer
+        try:
+            while True:
+                server = ranked[retries % len(ranked)]
+                runner_up = ranked[(retries + 1) % len(ranked)]
+                timeout = server.rto.timeout(retries // len(ranked))
+                hedge = self.selector.hedge_delay(server)
+
+                if pacer is not None:
+                    if trace is not None:
+                        paced = time.perf_counter()
+                    ticket = await pacer.acquire(server.address)
+                    if trace is not None:
+                        trace.pace += time.perf_counter() - paced
+                timed_out = False
+                try:
+                    self.__send(server, packet, sends, loop, trace)
+                    if trace is not None:
+                        attempt = time.perf_counter()
+                    if hedge is not None and hedge < timeout:
+                        try:
+                            raw, answered_by = await asyncio.wait_for(
+                                asyncio.shield(future), hedge
+                            )
+                        except asyncio.TimeoutError:
+                            # fire a hedged duplicate; whichever answers first wins
+                            # (duplicates are not paced)
+                            self.hedged += 1
+                            self.__send(runner_up, packet, sends, loop, trace)
+                            raw, answered_by = await asyncio.wait_for(
+                                asyncio.shield(future), timeout - hedge
+                            )
+                    else:
+                        raw, answered_by = await asyncio.wait_for(
+                            asyncio.shield(future), timeout
+                        )
+                    break
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    self.selector.record_failure(server)
+                    if trace is not None:
+                        trace.retry += time.perf_counter() - attempt
+                        metrics.count("timeouts", server=server.address)
+                    if retries >= self.retries:
+                        if trace is not None:
+                            trace.retries = retries
+                            trace.timed_out = True
+                            trace.finish()
+                        raise QueryTimeoutError(
+                            f"Maximum number of retries [{self.retries}] exceeded"
+                        )
+                    retries += 1
+                finally:
+                    if pacer is not None:
+                        pacer.release(server.address, timed_out, ticket)
+        finally:
+            self.__pending.pop(id, None)
+            if not future.done():
+                future.cancel()
+
+        # Karn's rule: only unambiguous (single transmission) RTT samples count
+        sent = sends[answered_by]
+        self.selector.record_success(
+            answered_by, loop.time() - sent[0], sample=len(sent) == 1
+        )
+
+        if trace is not None:
+            received = time.perf_counter()
+            trace.wait = received - attempt
+        response = Packet.build_response(raw, request, validate=False)
+        if trace is not None:
+            trace.parse = time.perf_counter() - received
+            trace.truncated = response.header.truncated
+
+        if response.header.truncated:
+            if trace is not None:
+                received = time.perf_counter()
+            try:
+                raw = await self.tcp.exchange(
+                    answered_by.address,
+                    answered_by.port,
+                    request,
+                    answered_by.rto.maximum,
+                )
+            except DnsError:
+                if trace is not None:
+                    trace.retries = retries
+                    trace.timed_out = True
+                    trace.finish()
+                raise
+            response = Packet.build_response(raw, request, validate=False)
+            if trace is not None:
+                trace.tcp = time.perf_counter() - received
+
+        if trace is not None:
+            trace.server = answered_by.address
+            trace.rcode = response.header.response_code
+            trace.retries = retries
+            trace.finish()
+
+        return response, retries
+
+    def __send(
+        self,
+        server: ServerStats,
+        packet: bytearray,
+        sends: dict[ServerStats, list[float]],
+        loop: asyncio.AbstractEventLoop,
+        trace: QueryTrace | None = None,
+    ) -> None:
+        sends.setdefault(server, []).append(loop.time())
+        if trace is None:
+            self.__transports[server].sendto(packet)
+            return
+
+        start = time.perf_counter()
+        self.__transports[server].sendto(packet)
+        trace.send += time.perf_counter() - start
+
+    def _on_datagram(self, data: bytes, server: ServerStats) -> None:
+        if len(data) < 12:
+            return
+
+        (id,) = struct.unpack_from("!H", data)
+        entry = self.__pending.get(id)
+        if entry is None:
+            return
+
+        question, future = entry
+        if future.done():
+            return
+
+        if data[12 : 12 + len(question)].lower() != question:
+            return
+
+        future.set_result((data, server))
+
+    def __allocate_id(self, preferred: int) -> int:
+        id = preferred
+        while id in self.__pending:
+            id = random.randint(0, 65535)
+        return id
@@ -0,0 +1,42 @@
+from dns_client.packet import Packet, PacketAnswer, RecordType
+
+
+class Resolution:
+    __slots__ = (
+        "name",
+        "qtype",
+        "response_code",
+        "authoritative",
+        "answers",
+        "authoritative_records",
+        "additional_records",
+        "elapsed",
+        "retries",
+        "cached",
+        "packet",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        qtype: RecordType,
+        packet: Packet,
+        elapsed: float = 0.0,
+        retries: int = 0,
+        cached: bool = False,
+    ):
+        self.name = name
+        self.qtype = qtype
+        self.response_code = packet.header.response_code
+        self.authoritative = packet.header.authoritative
+        self.answers = packet.answers
+        self.authoritative_records = packet.authoritative_records
+        self.additional_records = packet.additional_records
+        self.elapsed = elapsed
+        self.retries = retries
+        self.cached = cached
+        self.packet = packet
+
+    def get_records(self, record_section: str) -> list[PacketAnswer]:
+        records: list[PacketAnswer] = getattr(self, record_section, [])
+        return [a for a in records if a.is_supported_type()]
@@ -0,0 +1,49 @@
+import random
+
+
+class RetransmissionTimer:
+    # RFC 6298 smoothing constants
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+
+    def __init__(
+        self,
+        initial: float = 1.0,
+        minimum: float = 0.05,
+        maximum: float = 10.0,
+        jitter: float = 0.1,
+    ):
+        self.initial = initial
+        self.minimum = min(minimum, initial)
+        self.maximum = max(maximum, initial)
+        self.jitter = jitter
+        self.srtt: float | None = None
+        self.rttvar: float | None = None
+
+    def observe(self, rtt: float) -> None:
+        # Karn's rule: callers must only report samples from queries
+        # that were never retransmitted, otherwise the sample is ambiguous
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+            return
+
+        self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+        self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+    def get_rto(self) -> float:
+        if self.srtt is None:
+            return self.initial
+
+        return self.__clamp(self.srtt + self.K * self.rttvar)
+
+    def timeout(self, attempt: int = 0) -> float:
+        backoff = self.get_rto() * (2**attempt)
+        if self.jitter:
+            backoff *= random.uniform(1 - self.jitter, 1 + self.jitter)
+
+        return self.__clamp(backoff)
+
+    def __clamp(self, value: float) -> float:
+        return min(self.maximum, max(self.minimum, value))
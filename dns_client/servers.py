@@ -0,0 +1,75 @@
+import time
+from collections import deque
+from typing import Callable
+
+from dns_client.rto import RetransmissionTimer
+
+
+class ServerStats:
+    SAMPLES = 64
+
+    def __init__(self, address: str, port: int, timeout: float):
+        self.address = address
+        self.port = port
+        self.rto = RetransmissionTimer(initial=timeout)
+        self.latencies: deque[float] = deque(maxlen=self.SAMPLES)
+        self.failures = 0
+        self.penalty_until = 0.0
+
+    def score(self) -> float:
+        # servers without samples score best so that they get measured
+        return (self.rto.srtt or 0.0) + self.failures * self.rto.get_rto()
+
+    def percentile(self, p: float) -> float | None:
+        if not self.latencies:
+            return None
+
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def __repr__(self) -> str:
+        return f"ServerStats({self.address}:{self.port})"
+
+
+class ServerSelector:
+    def __init__(
+        self,
+        servers: list[str],
+        port: int = 53,
+        timeout: float = 1.0,
+        hedge_percentile: float = 0.9,
+        hedge_min_samples: int = 8,
+        penalty_threshold: int = 3,
+        penalty: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.servers = [ServerStats(s, port, timeout) for s in servers]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.penalty_threshold = penalty_threshold
+        self.penalty = penalty
+        self.clock = clock
+
+    def ranked(self) -> list[ServerStats]:
+        now = self.clock()
+        return sorted(
+            self.servers, key=lambda s: (s.penalty_until > now, s.score())
+        )
+
+    def hedge_delay(self, server: ServerStats) -> float | None:
+        if len(self.servers) < 2 or len(server.latencies) < self.hedge_min_samples:
+            return None
+
+        return server.percentile(self.hedge_percentile)
+
+    def record_success(self, server: ServerStats, rtt: float, sample: bool) -> None:
+        server.failures = 0
+        server.penalty_until = 0.0
+        if sample:
+            server.rto.observe(rtt)
+            server.latencies.append(rtt)
+
+    def record_failure(self, server: ServerStats) -> None:
+        server.failures += 1
+        if server.failures >= self.penalty_threshold:
+            server.penalty_until = self.clock() + self.penalty
@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import IO, Iterable, Iterator
+
+from dns_client.api import create_resolver
+from dns_client.bulk import open_input, read_names, resolve_line
+from dns_client.configuration import Configuration
+from dns_client.output import OutputSink, get_format
+
+
+def chunks(names: Iterable[str], size: int) -> Iterator[list[str]]:
+    names = iter(names)
+    while True:
+        chunk = list(itertools.islice(names, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _ShardWorker:
+    def __init__(self, config: Configuration):
+        self.config = config
+        self.format = get_format(config.output_format)
+        # one loop and one resolver per process, reused for every chunk
+        self.loop = asyncio.new_event_loop()
+        self.resolver = create_resolver(config)
+
+    def run(self, names: list[str]) -> str | bytes:
+        return self.loop.run_until_complete(self.__run(names))
+
+    async def __run(self, names: list[str]) -> str | bytes:
+        results = await asyncio.gather(
+            *(
+                resolve_line(
+                    self.resolver,
+                    name,
+                    mx=self.config.mx,
+                    ns=self.config.ns,
+                    format=self.format,
+                )
+                for name in names
+            )
+        )
+        return self.format.join(results)
+
+
+_worker: _ShardWorker | None = None
+
+
+def _init_worker(config: Configuration) -> None:
+    global _worker
+    _worker = _ShardWorker(config)
+
+
+def _run_chunk(names: list[str]) -> str | bytes:
+    return _worker.run(names)
+
+
+class ShardedTransmitter:
+    def __init__(self, config: Configuration, output: IO | None = None):
+        self.config = config
+        self.format = get_format(config.output_format)
+        self.output = OutputSink(self.format, output)
+
+    def transmit(self) -> None:
+        with open_input(self.config.file) as f:
+            self.run(read_names(f))
+
+    def run(self, names: Iterable[str]) -> None:
+        workers = self.config.workers
+        # keep every worker busy while the parent waits on the oldest chunk,
+        # without reading more of the input than that
+        window = workers * 2
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.config,),
+        )
+        with pool:
+            if self.config.ordered:
+                self.__run_ordered(pool, names, window)
+            else:
+                self.__run_unordered(pool, names, window)
+
+        self.output.flush()
+
+    def __run_ordered(
+        self, pool: ProcessPoolExecutor, names: Iterable[str], window: int
+    ) -> None:
+        pending: deque[Future] = deque()
+        for chunk in chunks(names, self.config.concurrency):
+            pending.append(pool.submit(_run_chunk, chunk))
+            if len(pending) >= window:
+                self.output.write(pending.popleft().result())
+
+        while pending:
+            self.output.write(pending.popleft().result())
+
+    def __run_unordered(
+        self, pool: ProcessPoolExecutor, names: Iterable[str], window: int
+    ) -> None:
+        pending: set[Future] = set()
+        for chunk in chunks(names, self.config.concurrency):
+            pending.add(pool.submit(_run_chunk, chunk))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                self.output.write(self.format.join(f.result() for f in done))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            self.output.write(self.format.join(f.result() for f in done))
@@ -0,0 +1,146 @@
+import asyncio
+import random
+import struct
+
+from dns_client.errors import ConnectionFailedError, QueryTimeoutError
+from dns_client.packet import Packet
+
+
+def frame(wire: bytes) -> bytes:
+    return struct.pack("!H", len(wire)) + wire
+
+
+class TcpConnection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self.__pending: dict[int, tuple[bytes, asyncio.Future]] = {}
+        self.__task = asyncio.ensure_future(self.__read_loop())
+
+    @classmethod
+    async def open(cls, server: str, port: int, timeout: float) -> "TcpConnection":
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(server, port), timeout
+            )
+        except asyncio.TimeoutError:
+            raise QueryTimeoutError(f"TCP connection to {server}:{port} timed out")
+        except OSError as e:
+            raise ConnectionFailedError(
+                f"TCP connection to {server}:{port} failed: {e.strerror or e}"
+            )
+        return cls(reader, writer)
+
+    def in_flight(self) -> int:
+        return len(self.__pending)
+
+    async def exchange(self, request: Packet, timeout: float) -> bytes:
+        if self.closed:
+            raise ConnectionFailedError("Connection closed by the name server")
+
+        id = request.header.id
+        while id in self.__pending:
+            id = random.randint(0, 65535)
+        request.set_id(id)
+
+        wire = request.pack()
+        question_end = 12 + request.question.get_packed_length()
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[id] = (bytes(wire[12:question_end]).lower(), future)
+        try:
+            # RFC 7766 pipelining: write without waiting for earlier answers
+            self.writer.write(frame(wire))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise QueryTimeoutError("Timed out waiting for a TCP response")
+        finally:
+            self.__pending.pop(id, None)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+        self.__task.cancel()
+        self.__fail_pending(ConnectionFailedError("Connection closed"))
+
+    async def __read_loop(self) -> None:
+        try:
+            while True:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+                message = await self.reader.readexactly(length)
+                if length < 12:
+                    continue
+
+                (id,) = struct.unpack_from("!H", message)
+                entry = self.__pending.get(id)
+                if entry is None:
+                    continue
+
+                question, future = entry
+                if future.done() or message[12 : 12 + len(question)].lower() != question:
+                    continue
+
+                future.set_result(message)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self.closed = True
+            self.writer.close()
+            self.__fail_pending(ConnectionFailedError(f"Connection lost: {e}"))
+
+    def __fail_pending(self, exc: Exception) -> None:
+        for _, future in self.__pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+
+class TcpConnectionPool:
+    def __init__(self, max_connections: int = 2, max_pipelined: int = 100):
+        self.max_connections = max_connections
+        self.max_pipelined = max_pipelined
+        self.__connections: dict[tuple[str, int], list[TcpConnection]] = {}
+        self.__opening: dict[tuple[str, int], asyncio.Future] = {}
+
+    async def exchange(
+        self, server: str, port: int, request: Packet, timeout: float
+    ) -> bytes:
+        connection = await self.__acquire(server, port, timeout)
+        try:
+            return await connection.exchange(request, timeout)
+        except ConnectionFailedError:
+            # persistent connections may be closed by the server while idle
+            connection = await self.__acquire(server, port, timeout)
+            return await connection.exchange(request, timeout)
+
+    def connection_count(self, server: str, port: int) -> int:
+        return len(self.__connections.get((server, port), []))
+
+    def close(self) -> None:
+        for connections in self.__connections.values():
+            for connection in connections:
+                connection.close()
+        self.__connections.clear()
+
+    async def __acquire(self, server: str, port: int, timeout: float) -> TcpConnection:
+        key = (server, port)
+        connections = [c for c in self.__connections.get(key, []) if not c.closed]
+        self.__connections[key] = connections
+
+        best = min(connections, key=TcpConnection.in_flight, default=None)
+        if best is not None and best.in_flight() < self.max_pipelined:
+            return best
+        if best is not None and len(connections) >= self.max_connections:
+            return best
+
+        # share a single in-progress connect between concurrent callers
+        opening = self.__opening.get(key)
+        if opening is None:
+            opening = asyncio.ensure_future(TcpConnection.open(server, port, timeout))
+            self.__opening[key] = opening
+            try:
+                connection = await opening
+            finally:
+                del self.__opening[key]
+            self.__connections.setdefault(key, []).append(connection)
+            return connection
+
+        return await asyncio.shield(opening)
@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import random
+import socket
+import struct
+from typing import Callable
+
+from dns_client.errors import MalformedPacketError
+from dns_client.iterative import normalize
+from dns_client.pacing import TokenBucket
+from dns_client.packet import DecompressionTable, RecordType, pack_name
+
+# A loopback authoritative server for load and failure testing: answers
+# from a small in-memory zone, with injectable delay, loss, reordering,
+# truncation and error rcodes, all drawn from a seeded random generator
+# so that a run can be reproduced.
+
+NOERROR = 0
+SERVFAIL = 2
+NXDOMAIN = 3
+REFUSED = 5
+
+Delay = float | Callable[[random.Random], float]
+
+
+def uniform(low: float, high: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.uniform(low, high)
+
+
+def exponential(mean: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+
+
+def encode_txt(data: str) -> bytes:
+    strings = [s.strip('"').encode() for s in data.split('" "')] if data else [b""]
+    return b"".join(bytes([len(s)]) + s for s in strings)
+
+
+def encode_soa(data: str) -> bytes:
+    mname, rname, *numbers = data.split()
+    return pack_name(mname) + pack_name(rname) + struct.pack("!IIIII", *map(int, numbers))
+
+
+def encode_mx(data: str) -> bytes:
+    preference, exchange = data.split()
+    return struct.pack("!H", int(preference)) + pack_name(exchange)
+
+
+def encode_srv(data: str) -> bytes:
+    priority, weight, port, target = data.split()
+    return struct.pack("!HHH", int(priority), int(weight), int(port)) + pack_name(target)
+
+
+# rdata encoders keyed by type, the inverse of packet.DECODERS
+ENCODERS: dict[RecordType, Callable[[str], bytes]] = {
+    RecordType.A: lambda data: socket.inet_aton(data),
+    RecordType.AAAA: lambda data: socket.inet_pton(socket.AF_INET6, data),
+    RecordType.NS: pack_name,
+    RecordType.CNAME: pack_name,
+    RecordType.PTR: pack_name,
+    RecordType.MX: encode_mx,
+    RecordType.TXT: encode_txt,
+    RecordType.SOA: encode_soa,
+    RecordType.SRV: encode_srv,
+}
+
+
+class ZoneRecord:
+    __slots__ = ("name", "qtype", "ttl", "rdata")
+
+    def __init__(self, name: str, qtype: RecordType, ttl: int, rdata: bytes):
+        self.name = name
+        self.qtype = qtype
+        self.ttl = ttl
+        self.rdata = rdata
+
+    def pack(self, owner: str) -> bytes:
+        return (
+            pack_name(owner)
+            + struct.pack("!HHIH", self.qtype.value, 1, self.ttl, len(self.rdata))
+            + self.rdata
+        )
+
+
+class Zone:
+    MAX_CNAMES = 8
+
+    def __init__(self, default_ttl: int = 300):
+        self.default_ttl = default_ttl
+        self.__records: dict[str, list[ZoneRecord]] = {}
+
+    @classmethod
+    def from_text(cls, text: str, default_ttl: int = 300) -> "Zone":
+        # one record per line: name [ttl] type data; ';' starts a comment
+        zone = cls(default_ttl)
+        for line in text.splitlines():
+            line = line.split(";", 1)[0].strip()
+            if not line:
+                continue
+
+            name, _, rest = line.partition(" ")
+            fields = rest.split(None, 1)
+            ttl = None
+            if fields and fields[0].isdigit():
+                ttl = int(fields[0])
+                fields = fields[1].split(None, 1) if len(fields) > 1 else []
+            if len(fields) != 2:
+                raise ValueError(f"Invalid zone line: {line!r}")
+
+            zone.add(name, fields[0], fields[1], ttl)
+
+        return zone
+
+    def add(self, name: str, qtype: str, data: str, ttl: int | None = None) -> None:
+        try:
+            record_type = RecordType[qtype.upper()]
+        except KeyError:
+            raise ValueError(f"Unsupported record type {qtype!r}") from None
+
+        record = ZoneRecord(
+            normalize(name),
+            record_type,
+            self.default_ttl if ttl is None else ttl,
+            ENCODERS[record_type](data.strip()),
+        )
+        self.__records.setdefault(record.name, []).append(record)
+
+    def find(self, name: str) -> list[ZoneRecord] | None:
+        # exact match first, then the closest wildcard; None when the name
+        # does not exist at all
+        name = normalize(name)
+        records = self.__records.get(name)
+        if records is not None:
+            return records
+
+        labels = name.split(".")
+        for i in range(1, len(labels)):
+            records = self.__records.get("*." + ".".join(labels[i:]))
+            if records is not None:
+                return records
+
+        return None
+
+    def soa(self, name: str) -> tuple[str, ZoneRecord] | None:
+        labels = normalize(name).split(".")
+        for i in range(len(labels)):
+            apex = ".".join(labels[i:])
+            for record in self.__records.get(apex, ()):
+                if record.qtype == RecordType.SOA:
+                    return apex, record
+
+        return None
+
+    def answer(self, name: str, qtype: int) -> tuple[int, list[bytes], list[bytes]]:
+        answers: list[bytes] = []
+        owner = name
+        for _ in range(self.MAX_CNAMES):
+            records = self.find(owner)
+            if records is None:
+                return NXDOMAIN if not answers else NOERROR, answers, self.__negative(owner)
+
+            matching = [r for r in records if r.qtype.value == qtype]
+            if matching:
+                answers.extend(r.pack(owner) for r in matching)
+                return NOERROR, answers, []
+
+            cname = next((r for r in records if r.qtype == RecordType.CNAME), None)
+            if cname is None:
+                return NOERROR, answers, self.__negative(owner)
+
+            answers.append(cname.pack(owner))
+            owner, _ = DecompressionTable(cname.rdata).read(0)
+
+        return NOERROR, answers, []
+
+    def __negative(self, name: str) -> list[bytes]:
+        found = self.soa(name)
+        if found is None:
+            return []
+
+        apex, record = found
+        return [record.pack(apex)]
+
+
+class FakeServer:
+    def __init__(
+        self,
+        zone: Zone,
+        delay: Delay = 0.0,
+        loss: float = 0.0,
+        reorder: float = 0.0,
+        truncate: float = 0.0,
+        error_rate: float = 0.0,
+        error_rcode: int = SERVFAIL,
+        rcodes: dict[str, int] | None = None,
+        recursion_available: bool = True,
+        capacity: float | None = None,
+        seed: int | None = None,
+    ):
+        self.zone = zone
+        self.delay = delay
+        self.loss = loss
+        self.reorder = reorder
+        self.truncate = truncate
+        self.error_rate = error_rate
+        self.error_rcode = error_rcode
+        self.rcodes = {normalize(k): v for k, v in (rcodes or {}).items()}
+        self.recursion_available = recursion_available
+        # UDP queries beyond `capacity` per second (bursts of a tenth of
+        # that) are dropped, like an overloaded server
+        self.capacity = TokenBucket(capacity) if capacity else None
+        self.random = random.Random(seed)
+        self.queries = 0
+        self.tcp_queries = 0
+        self.dropped = 0
+        self.truncated = 0
+        self.reordered = 0
+        self.port = 0
+        self.__udp: asyncio.DatagramTransport | None = None
+        self.__tcp: asyncio.AbstractServer | None = None
+        self.__held: tuple[bytes, tuple] | None = None
+        self.__connections: set[asyncio.StreamWriter] = set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeServer":
+        loop = asyncio.get_running_loop()
+        self.__udp, _ = await loop.create_datagram_endpoint(
+            lambda: _FakeProtocol(self), local_addr=(host, port)
+        )
+        self.port = self.__udp.get_extra_info("sockname")[1]
+        self.__tcp = await asyncio.start_server(self.__serve_tcp, host, self.port)
+        return self
+
+    def close(self) -> None:
+        if self.__udp is not None:
+            self.__udp.close()
+        if self.__tcp is not None:
+            self.__tcp.close()
+        for writer in self.__connections:
+            writer.close()
+
+    async def __aenter__(self) -> "FakeServer":
+        if self.__udp is None:
+            await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    def respond(self, query: bytes, udp: bool = True) -> bytes | None:
+        try:
+            name, end = DecompressionTable(query).read(12)
+            qtype, _ = struct.unpack_from("!HH", query, end)
+        except (MalformedPacketError, struct.error):
+            return None
+
+        question = query[12 : end + 4]
+        rng = self.random
+        rcode = self.rcodes.get(normalize(name))
+        if rcode is None and self.error_rate and rng.random() < self.error_rate:
+            rcode = self.error_rcode
+        if rcode is not None:
+            return self.__message(query, rcode, question)
+
+        if udp and self.truncate and rng.random() < self.truncate:
+            self.truncated += 1
+            return self.__message(query, NOERROR, question, truncated=True)
+
+        rcode, answers, authority = self.zone.answer(name, qtype)
+        return self.__message(query, rcode, question, answers, authority)
+
+    def __message(
+        self,
+        query: bytes,
+        rcode: int,
+        question: bytes,
+        answers: list[bytes] = [],
+        authority: list[bytes] = [],
+        truncated: bool = False,
+    ) -> bytes:
+        (flags,) = struct.unpack_from("!H", query, 2)
+        flags = 0x8000 | 0x0400 | (flags & 0x0100) | rcode
+        if self.recursion_available:
+            flags |= 0x0080
+        if truncated:
+            flags |= 0x0200
+        return (
+            query[:2]
+            + struct.pack("!HHHHH", flags, 1, len(answers), len(authority), 0)
+            + question
+            + b"".join(answers)
+            + b"".join(authority)
+        )
+
+    def _on_datagram(self, data: bytes, addr) -> None:
+        self.queries += 1
+        rng = self.random
+        if self.loss and rng.random() < self.loss:
+            self.dropped += 1
+            return
+        if self.capacity is not None and not self.capacity.try_take():
+            self.dropped += 1
+            return
+
+        response = self.respond(data)
+        if response is None:
+            return
+
+        delay = self.delay(rng) if callable(self.delay) else self.delay
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self.__send, response, addr)
+        else:
+            self.__send(response, addr)
+
+    def __send(self, response: bytes, addr) -> None:
+        if self.__udp is None or self.__udp.is_closing():
+            return
+
+        if self.__held is None and self.reorder and self.random.random() < self.reorder:
+            # hold this reply until the next one goes out (or briefly)
+            self.reordered += 1
+            self.__held = (response, addr)
+            asyncio.get_running_loop().call_later(0.05, self.__release)
+            return
+
+        self.__udp.sendto(response, addr)
+        self.__release()
+
+    def __release(self) -> None:
+        if self.__held is not None and not self.__udp.is_closing():
+            self.__udp.sendto(*self.__held)
+        self.__held = None
+
+    async def __serve_tcp(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.__connections.add(writer)
+        try:
+            while True:
+                (length,) = struct.unpack("!H", await reader.readexactly(2))
+                query = await reader.readexactly(length)
+                self.queries += 1
+                self.tcp_queries += 1
+                response = self.respond(query, udp=False)
+                if response is None:
+                    continue
+
+                delay = self.delay(self.random) if callable(self.delay) else self.delay
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(struct.pack("!H", len(response)) + response)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # a cancelled handler (loop shutdown) ends the connection quietly
+            pass
+        finally:
+            self.__connections.discard(writer)
+            writer.close()
+
+
+class _FakeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: FakeServer):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.server._on_datagram(data, addr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a zone file from a fake DNS server with injected faults"
+    )
+    parser.add_argument("zone", help="Zone file: one 'name [ttl] type data' per line")
+    parser.add_argument("-p", type=int, help="UDP and TCP port to listen on", default=5353)
+    parser.add_argument("-d", type=float, help="Mean reply delay in seconds (exponential)", default=0.0)
+    parser.add_argument("-l", type=float, help="Probability of dropping a UDP query", default=0.0)
+    parser.add_argument("-R", type=float, help="Probability of delaying a reply behind the next one", default=0.0)
+    parser.add_argument("-T", type=float, help="Probability of a truncated (TC) UDP reply", default=0.0)
+    parser.add_argument("-E", type=float, help="Probability of a SERVFAIL reply", default=0.0)
+    parser.add_argument("-C", type=float, help="Drop UDP queries beyond this many per second", default=None)
+    parser.add_argument("-s", type=int, help="Random seed", default=None)
+    args = parser.parse_args()
+
+    with open(args.zone) as f:
+        zone = Zone.from_text(f.read())
+
+    async def serve() -> None:
+        server = FakeServer(
+            zone,
+            delay=exponential(args.d),
+            loss=args.l,
+            reorder=args.R,
+            truncate=args.T,
+            error_rate=args.E,
+            capacity=args.C,
+            seed=args.s,
+        )
+        await server.start("127.0.0.1", args.p)
+        print(f"serving {args.zone} on 127.0.0.1:{server.port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
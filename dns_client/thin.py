@@ -0,0 +1,58 @@
+import socket
+import sys
+import threading
+from collections.abc import Iterable
+from io import BufferedIOBase
+
+# A client for the daemon's Unix socket that only needs the standard
+# library's socket module, so a lookup costs interpreter startup plus one
+# local round trip:
+#
+#   python -m dns_client.thin /tmp/dns_client.sock example.com [MX|NS]
+#   python -m dns_client.thin /tmp/dns_client.sock < domains.txt
+
+USAGE = "usage: python -m dns_client.thin SOCKET [name [A|MX|NS]]"
+
+
+def query(path: str, lines: Iterable[bytes], output: BufferedIOBase) -> None:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+
+        # replies stream back while requests are still being written, so
+        # the two directions run independently
+        def send() -> None:
+            for line in lines:
+                sock.sendall(line)
+            sock.shutdown(socket.SHUT_WR)
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        while chunk := sock.recv(65536):
+            output.write(chunk)
+        sender.join()
+
+    output.flush()
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE, file=sys.stderr)
+        return 2
+
+    if len(argv) > 1:
+        lines: Iterable[bytes] = [" ".join(argv[1:]).encode() + b"\n"]
+    else:
+        lines = sys.stdin.buffer
+
+    try:
+        query(argv[0], lines, sys.stdout.buffer)
+    except OSError as e:
+        print(f"ERROR \t {argv[0]}: {e.strerror or e}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
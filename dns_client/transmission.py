@@ -1,8 +1,11 @@
-import socket
-import time
+import asyncio
 
+from dns_client import presentation
+from dns_client.api import create_resolver
 from dns_client.configuration import Configuration
-from dns_client.packet import Packet, RecordType
+from dns_client.errors import DnsError
+from dns_client.packet import PacketQuestion
+from dns_client.result import Resolution
 
 
 class Transmitter:
@@ -10,70 +13,30 @@ class Transmitter:
         self.config = config
 
     def transmit(self):
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.connect((self.config.server, self.config.port))
-        sock.settimeout(self.config.timeout)
-        request = Packet.build_request(
-            self.config.name, mx=self.config.mx, ns=self.config.ns
-        )
-        packet = request.pack()
-
-        retries = 0
-
-        print(f"DnsClient sending request for {request.question.name}")
-        print(f"Server: {self.config.server}")
-        print("Request type: ", request.question.qtype.to_str())
-
-        startTime = time.time()
-        while True:
-            try:
-                sock.send(packet)
-                res = sock.recv(512)
-                if res:
-                    break
-            except socket.timeout:
-                if retries >= self.config.retries:
-                    print(
-                        f"ERROR \t Maximum number of retries [{self.config.retries}] exceeded"
-                    )
-                    return 0
-                retries += 1
-
-        endTime = time.time()
-        response_time = endTime - startTime
-        response_time_str = "%.4f" % response_time
+        question = PacketQuestion(self.config.name, self.config.mx, self.config.ns)
         print(
-            f"Response received after {response_time_str} seconds ({retries} retries)\n"
+            presentation.format_request(
+                question.name, question.qtype, self.config.servers
+            )
         )
 
-        response = Packet.build_response(res, request)
-
-        self.display_records(response, "answers", "Answer Section")
-        print()
-        self.display_records(response, "authoritative_records", "Authoritative Section")
-        print()
-        self.display_records(response, "additional_records", "Additional Section")
-
-    @classmethod
-    def display_records(cls, response: Packet, record_section: str, title: str):
-        responses = response.get_records(record_section)
-        count = len(responses)
-        print(f"*** {title} ({count} records) ***")
-        if count == 0:
-            print("NOTFOUND")
-            return
+        # record data is decoded while formatting, so a malformed record is
+        # reported like any other error
+        try:
+            resolution = asyncio.run(self.__resolve())
+            output = presentation.format_resolution(resolution)
+        except DnsError as e:
+            print(presentation.format_error(e))
+            exit(1)
 
-        isAuth = "auth" if response.header.authoritative else "nonauth"
-        for record in responses:
-            data = [
-                record.get_type_str(),
-                str(record.data),
-                str(record.ttl),
-                isAuth,
-            ]
+        print(output)
 
-            if record.data_type == RecordType.MX.value:
-                data.insert(2, str(record.preference))
-
-            output = " \t ".join(data)
-            print(output)
+    async def __resolve(self) -> Resolution:
+        async with create_resolver(self.config) as resolver:
+            try:
+                return await resolver.resolve(
+                    self.config.name, mx=self.config.mx, ns=self.config.ns
+                )
+            finally:
+                if resolver.metrics is not None:
+                    resolver.metrics.write(self.config.metrics_file)
@@ -1,7 +1,36 @@
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import socket
+import tempfile
+import types
 import unittest
 import struct
 
-from dns_client.packet import Packet, PacketHeader, PacketQuestion, PacketAnswer, RecordType
+from dns_client.packet import Packet, PacketHeader, PacketQuestion, PacketAnswer, PacketOpt, RecordType, DecompressionTable, MalformedPacketError
+from dns_client.resolver import AsyncResolver
+from dns_client.bulk import BulkTransmitter, read_names
+from dns_client.sharding import ShardedTransmitter
+from dns_client.cache import ResponseCache
+from dns_client.disk_cache import DiskCache
+from dns_client.records import RecordSet
+from dns_client.rto import RetransmissionTimer
+from dns_client.servers import ServerSelector
+from dns_client.api import create_resolver
+from dns_client.errors import ConnectionFailedError, NameNotFoundError, QueryTimeoutError, RecursionNotAvailableError, ServerFailureError, UnexpectedClassError
+from dns_client import presentation
+from dns_client.iterative import DelegationCache, IterativeResolver
+from dns_client import pcap, thin
+from dns_client.daemon import LocalDaemon, adjust_response
+from dns_client.pcap import CaptureError, CaptureReader
+from dns_client.tcp import TcpConnectionPool, frame
+from dns_client.output import CsvFormat, OutputSink, TextFormat
+from dns_client.testing import FakeServer, Zone
+from dns_client.metrics import Histogram, Metrics
+from dns_client.pacing import SendScheduler, TokenBucket
 
 class TestPacketHeader(unittest.TestCase):
     header = PacketHeader(
@@ -42,6 +71,16 @@ class TestPacketHeader(unittest.TestCase):
         self.assertEqual(method_header.question_count, 2)
         self.assertTrue(method_header.recursive)
 
+    def test_validate_header_errors_raise(self):
+        header = PacketHeader(id=1, response=True, recursive_supported=True, response_code=3)
+        with self.assertRaises(NameNotFoundError) as ctx:
+            header.validateHeaderErrors()
+        self.assertEqual(ctx.exception.response_code, 3)
+        self.assertEqual(presentation.format_error(ctx.exception), "NOTFOUND \t " + PacketHeader.ERRORS[3])
+
+        with self.assertRaises(RecursionNotAvailableError):
+            PacketHeader(id=1, response=True).validateHeaderErrors()
+
     def test_build_response(self):
         raw_data = struct.pack("!HHHHHH", 1234, 0b1000101010100001, 2, 3, 4, 5)
         method_header = PacketHeader.build_response(raw_data)
@@ -65,6 +104,10 @@ class TestPacketQuestion(unittest.TestCase):
         self.assertEqual(question.name, "\x03www\x06mcgill\x02ca\x00")
         self.assertEqual(question.qtype, RecordType.A)
 
+    def test_fully_qualified_names(self):
+        self.assertEqual(PacketQuestion("example.com.").pack(), PacketQuestion("example.com").pack())
+        self.assertEqual(PacketQuestion(".").pack()[:-4], b"\x00")
+
 class TestPacketAnswer(unittest.TestCase):
     def test_build_answer(self):
         # Raw answer to test extraction
@@ -77,6 +120,114 @@ class TestPacketAnswer(unittest.TestCase):
         self.assertEqual(answers[0].data_length, 4)
         self.assertEqual(answers[0].data, "132.216.177.160")
 
+    def test_unexpected_class_raises(self):
+        raw_response = b"\x00" * 12 + b"\x00\x00\x01\x00\x03\x00\x00\x00\x3c\x00\x04\x7f\x00\x00\x01"
+        with self.assertRaises(UnexpectedClassError):
+            PacketAnswer.build_answer(raw_response, 12, 1)
+
+    def test_rdata_is_lazy_view(self):
+        raw_response = b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00" + b"\x07example\x03com\x00\x00\x0f\x00\x01" + b"\x07example\x03com\x00\x00\x0f\x00\x01\x00\x00\x00\x3c\x00\x09\x00\x0a\x04mail\xc0\x0c"
+        answers, end = PacketAnswer.build_answer(raw_response, 29, 1)
+
+        self.assertEqual(end, len(raw_response))
+        self.assertIsInstance(answers[0].rdata(), memoryview)
+        self.assertIsNone(answers[0]._raw)
+        self.assertEqual(answers[0].name, "example.com")
+        self.assertEqual(answers[0].preference, 10)
+        self.assertEqual(answers[0].data, "mail.example.com")
+        self.assertEqual(answers[0].raw, b"\x00\x0a\x04mail\xc0\x0c")
+
+    def test_record_type_decoders(self):
+        records = [
+            encode_record("example.com", RecordType.AAAA.value, bytes.fromhex("20010db8000000000000000000000001")),
+            encode_record("example.com", RecordType.TXT.value, b"\x05hello\x07a \"b\" c"),
+            encode_record("example.com", RecordType.SOA.value, encode_name("ns.example.com") + encode_name("admin.example.com") + struct.pack("!IIIII", 7, 3600, 600, 86400, 300)),
+            encode_record("1.0.0.127.in-addr.arpa", RecordType.PTR.value, encode_name("localhost")),
+            encode_record("_sip._udp.example.com", RecordType.SRV.value, struct.pack("!HHH", 10, 5, 5060) + encode_name("sip.example.com")),
+            encode_record("example.com", 0xFF00, b"\xde\xad"),
+        ]
+        raw_response = b"\x00" * 12 + b"".join(records)
+        answers, _ = PacketAnswer.build_answer(raw_response, 12, len(records))
+        aaaa, txt, soa, ptr, srv, unknown = answers
+
+        self.assertEqual(aaaa.data, "2001:db8::1")
+        self.assertEqual(txt.data, '"hello" "a \\"b\\" c"')
+        self.assertEqual(soa.data, "ns.example.com admin.example.com 7 3600 600 86400 300")
+        self.assertEqual(ptr.data, "localhost")
+        self.assertEqual((srv.preference, srv.data), (10, "5 5060 sip.example.com"))
+        self.assertEqual([a.get_type_str() for a in answers[:5]], ["AAAA", "TXT", "SOA", "PTR", "SRV"])
+
+        self.assertFalse(unknown.is_supported_type())
+        self.assertEqual(unknown.get_type_str(), "TYPE65280")
+        self.assertIsNone(unknown._data)
+        self.assertEqual(unknown.data, "\\# 2 dead")
+
+        short = encode_record("example.com", RecordType.SRV.value, b"\x00\x0a")
+        answers, _ = PacketAnswer.build_answer(b"\x00" * 12 + short, 12, 1)
+        with self.assertRaises(MalformedPacketError):
+            answers[0].data
+
+        # fixed-length types are checked while parsing, not on first decode
+        short = encode_record("example.com", RecordType.A.value, b"\x0a\x00\x00")
+        with self.assertRaises(MalformedPacketError):
+            PacketAnswer.build_answer(b"\x00" * 12 + short, 12, 1)
+
+class TestPacketOpt(unittest.TestCase):
+    def test_request_advertises_payload_size(self):
+        packet = Packet.build_request(name="example.com", payload_size=4096)
+        wire = packet.pack()
+
+        self.assertEqual(packet.header.additional_records_count, 1)
+        self.assertEqual(wire[-11:], b"\x00\x00\x29\x10\x00\x00\x00\x00\x00\x00\x00")
+        self.assertEqual(struct.unpack("!H", wire[10:12])[0], 1)
+
+    def test_response_opt_is_parsed(self):
+        request = Packet.build_request(name="example.com", payload_size=1232)
+        raw_response = b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x00\x00\x01" + b"\x07example\x03com\x00\x00\x01\x00\x01" + b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\xa8\x00\x01" + b"\x00\x00\x29\x04\xd0\x00\x00\x80\x00\x00\x00"
+        response = Packet.build_response(raw_response, request)
+
+        self.assertEqual(response.additional_records, [])
+        self.assertEqual(response.edns.payload_size, 1232)
+        self.assertTrue(response.edns.dnssec_ok)
+        self.assertEqual(response.answers[0].data, "192.168.0.1")
+
+class TestDecompressionTable(unittest.TestCase):
+    def test_shared_suffixes_are_memoized(self):
+        message = b"\x00" * 12 + b"\x03www\x07example\x03com\x00" + b"\x04mail\xc0\x10" + b"\xc0\x1d"
+        table = DecompressionTable(message)
+
+        self.assertEqual(table.read(12), ("www.example.com", 29))
+        self.assertEqual(table.read(29), ("mail.example.com", 36))
+        self.assertEqual(table.read(36), ("mail.example.com", 38))
+        self.assertEqual(table.read(16), ("example.com", 29))
+        self.assertEqual(table.names[16], ("example.com", 13, 29))
+
+    def test_pointer_loop_fails_fast(self):
+        table = DecompressionTable(b"\x00" * 12 + b"\xc0\x0e\xc0\x0c")
+        with self.assertRaises(MalformedPacketError):
+            table.read(12)
+
+        table = DecompressionTable(b"\x00" * 12 + b"\x01a\xc0\x0c")
+        with self.assertRaises(MalformedPacketError):
+            table.read(12)
+
+    def test_name_length_limit(self):
+        name = b"\x3f" + b"a" * 63
+        with self.assertRaises(MalformedPacketError):
+            DecompressionTable(name * 4 + b"\x00").read(0)
+        self.assertEqual(len(DecompressionTable(name * 3 + b"\x3da" + b"a" * 60 + b"\x00").read(0)[0]), 253)
+
+    def test_binary_labels_are_escaped(self):
+        # RFC 2181 allows any byte in a label; the name must survive a round trip
+        wire = b"\x04caf\xe9\x03a.b\x02\\ \x00"
+        message = b"\x00" * 12 + wire + b"\x04next\xc0\x0c"
+        table = DecompressionTable(message)
+
+        self.assertEqual(table.read(12), ("caf\\233.a\\.b.\\\\\\032", 12 + len(wire)))
+        self.assertEqual(table.read(12 + len(wire)), ("next.caf\\233.a\\.b.\\\\\\032", len(message)))
+        self.assertEqual(table.names[12 + len(wire)][1], 5 + len(wire))
+        self.assertEqual(PacketQuestion(table.read(12)[0]).pack()[:-4], wire)
+
 class TestPacket(unittest.TestCase):
     def test_build_request_packet(self):
         packet = Packet.build_request(name="example.com")
@@ -89,6 +240,19 @@ class TestPacket(unittest.TestCase):
 
         self.assertEqual(packed_data, expected_header + expected_question)
 
+    def test_request_template_reuse(self):
+        first = Packet.build_request(name="example.com", mx=True)
+        second = Packet.build_request(name="example.com", mx=True)
+        wire = first.pack()
+
+        self.assertEqual(wire[2:], second.pack()[2:])
+        self.assertIsNot(wire, second.pack())
+
+        first.set_id(0xBEEF)
+        self.assertIs(first.pack(), wire)
+        self.assertEqual(wire[:2], b"\xbe\xef")
+        self.assertEqual(bytes(wire), first.header.pack() + first.question.pack())
+
     def test_build_response_packet(self):
         request_packet = Packet.build_request(name="example.com")
         raw_response = b"\x12\x34\x81\x80\x00\x01\x00\x01\x00\x00\x00\x00" + b"\x07example\x03com\x00\x00\x01\x00\x01" + b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\xa8\x00\x01"
@@ -97,5 +261,1080 @@ class TestPacket(unittest.TestCase):
         self.assertEqual(response_packet.header.id, 0x1234)
         self.assertEqual(response_packet.answers[0].data, "192.168.0.1")
 
+def answer_for(query: bytes, address: str = "10.0.0.1", ttl: int = 60, rcode: int = 0) -> bytes:
+    # Echo the question and append one A record pointing back at it
+    header = query[:2] + bytes([0x81, 0x80 | rcode]) + b"\x00\x01\x00\x01\x00\x00\x00\x00"
+    record = b"\xc0\x0c\x00\x01\x00\x01" + struct.pack("!IH", ttl, 4) + bytes(map(int, address.split(".")))
+    return header + query[12 : query.index(b"\x00", 12) + 5] + record
+
+def truncated_for(query: bytes) -> bytes:
+    header = query[:2] + b"\x83\x80\x00\x01\x00\x00\x00\x00\x00\x00"
+    return header + query[12 : query.index(b"\x00", 12) + 5]
+
+class StubServer(asyncio.DatagramProtocol):
+    def __init__(self, drop_first: int = 0, batch: int = 1, truncate: bool = False, rcode: int = 0):
+        self.rcode = rcode
+        self.drop_first = drop_first
+        self.batch = batch
+        self.truncate = truncate
+        self.received = 0
+        self.queued = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if self.received <= self.drop_first:
+            return
+        self.queued.append((data, addr))
+        if len(self.queued) >= self.batch:
+            # answer in reverse order to exercise id demultiplexing
+            for query, peer in reversed(self.queued):
+                reply = truncated_for(query) if self.truncate else answer_for(query, rcode=self.rcode)
+                self.transport.sendto(reply, peer)
+            self.queued = []
+
+class StubTcpServer:
+    def __init__(self):
+        self.connections = 0
+        self.queries = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        queued = []
+        try:
+            while True:
+                (length,) = struct.unpack("!H", await reader.readexactly(2))
+                queued.append(await reader.readexactly(length))
+                self.queries += 1
+                # answer pipelined queries in pairs, out of order
+                if len(queued) == 2:
+                    for query in reversed(queued):
+                        reply = answer_for(query, "10.0.0.2")
+                        writer.write(struct.pack("!H", len(reply)) + reply)
+                    queued = []
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+async def start_stub(host="127.0.0.1", port=0, **kwargs):
+    loop = asyncio.get_running_loop()
+    transport, stub = await loop.create_datagram_endpoint(
+        lambda: StubServer(**kwargs), local_addr=(host, port)
+    )
+    return transport, stub, transport.get_extra_info("sockname")[1]
+
+def make_config(port, **overrides):
+    # the Configuration attributes the transmitters read, pointed at a local stub
+    defaults = dict(
+        servers=["127.0.0.1"], port=port, timeout=2, retries=1, mx=False, ns=False, concurrency=4,
+        payload_size=None, workers=1, ordered=True, iterative=False, output_format="text",
+        cache_file=None, metrics_file=None, rate=None,
+    )
+    return types.SimpleNamespace(**{**defaults, **overrides})
+
+class TestAsyncResolver(unittest.IsolatedAsyncioTestCase):
+    async def test_many_in_flight(self):
+        transport, stub, port = await start_stub(batch=50)
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2) as resolver:
+                names = [f"host{i}.example.com" for i in range(200)]
+                responses = await asyncio.gather(*(resolver.query(n) for n in names))
+                self.assertEqual(resolver.in_flight(), 0)
+        finally:
+            transport.close()
+
+        self.assertEqual(stub.received, 200)
+        for name, response in zip(names, responses):
+            self.assertEqual(response.answers[0].data, "10.0.0.1")
+            self.assertIn(name.split(".")[0].encode(), response.question.name.encode())
+
+    async def test_retry_and_timeout(self):
+        transport, stub, port = await start_stub(drop_first=1)
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=0.05, retries=2) as resolver:
+                response, retries = await resolver.exchange(Packet.build_request("example.com"))
+                self.assertEqual(retries, 1)
+                self.assertEqual(response.answers[0].data, "10.0.0.1")
+
+            stub.drop_first = 100
+            async with AsyncResolver("127.0.0.1", port, timeout=0.02, retries=1) as resolver:
+                with self.assertRaises(TimeoutError):
+                    await resolver.query("example.com")
+        finally:
+            transport.close()
+
+    async def test_concurrent_first_queries_open_sockets_once(self):
+        first, _, port = await start_stub()
+        second, _, _ = await start_stub(host="127.0.0.2", port=port)
+        loop = asyncio.get_running_loop()
+        create = loop.create_datagram_endpoint
+        opened = []
+
+        async def counting(factory, **kwargs):
+            opened.append(kwargs["remote_addr"])
+            return await create(factory, **kwargs)
+
+        loop.create_datagram_endpoint = counting
+        try:
+            async with AsyncResolver(["127.0.0.1", "127.0.0.2"], port, timeout=2) as resolver:
+                resolutions = await asyncio.gather(
+                    *(resolver.resolve(f"host{i}.example.com") for i in range(20))
+                )
+        finally:
+            del loop.create_datagram_endpoint
+            first.close()
+            second.close()
+
+        self.assertEqual(len(resolutions), 20)
+        self.assertEqual(sorted(opened), [("127.0.0.1", port), ("127.0.0.2", port)])
+
+class TestRecordSet(unittest.TestCase):
+    raw_response = b"\x12\x34\x81\x80\x00\x01\x00\x02\x00\x00\x00\x00" + b"\x07example\x03com\x00\x00\x01\x00\x01" + b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\xa8\x00\x01" + b"\xc0\x0c\x00\x0f\x00\x01\x00\x00\x00\x3c\x00\x09\x00\x0a\x04mail\xc0\x0c"
+
+    def test_columnar_round_trip(self):
+        response = Packet.build_response(self.raw_response, Packet.build_request(name="example.com"))
+        records = RecordSet(response.answers)
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(list(records.addresses), [0xC0A80001, 0])
+        self.assertIs(records.names[0], records.names[1])
+        self.assertEqual(records.get_address(0), "192.168.0.1")
+        self.assertIsNone(records.get_address(1))
+
+        a, mx = records
+        self.assertEqual((a.name, a.data, a.ttl, a.raw), ("example.com", "192.168.0.1", 60, b"\xc0\xa8\x00\x01"))
+        self.assertEqual((mx.data_type, mx.data, mx.preference), (RecordType.MX.value, "mail.example.com", 10))
+        self.assertEqual((mx.data_length, mx.raw), (9, b"\x00\x0a\x04mail\xc0\x0c"))
+        self.assertEqual(records.ttls.itemsize, 4)
+        self.assertFalse(hasattr(records[-1], "__dict__"))
+
+class TestRetransmissionTimer(unittest.TestCase):
+    def test_estimator_and_backoff(self):
+        timer = RetransmissionTimer(initial=1.0, minimum=0.05, maximum=4.0, jitter=0)
+        self.assertEqual(timer.timeout(), 1.0)
+
+        timer.observe(0.02)
+        self.assertAlmostEqual(timer.get_rto(), 0.06)
+        for _ in range(50):
+            timer.observe(0.01)
+        self.assertEqual(timer.get_rto(), 0.05)
+
+        timer.observe(0.2)
+        rto = timer.get_rto()
+        self.assertAlmostEqual(timer.timeout(2), rto * 4)
+        self.assertEqual(timer.timeout(10), 4.0)
+
+    def test_jitter_stays_within_bounds(self):
+        timer = RetransmissionTimer(initial=0.5, minimum=0.1, maximum=1.0, jitter=0.5)
+        for attempt in range(5):
+            self.assertTrue(0.1 <= timer.timeout(attempt) <= 1.0)
+
+class TestShardedTransmitter(unittest.IsolatedAsyncioTestCase):
+    async def test_ordered_output_across_workers(self):
+        transport, stub, port = await start_stub()
+        config = make_config(port, concurrency=3, workers=2)
+        output = io.StringIO()
+        names = [f"host{i}.example.com" for i in range(20)]
+        try:
+            transmitter = ShardedTransmitter(config, output)
+            await asyncio.get_running_loop().run_in_executor(None, transmitter.run, iter(names))
+        finally:
+            transport.close()
+
+        results = output.getvalue().splitlines()
+        self.assertEqual([r.split(" \t ")[0] for r in results], names)
+        self.assertEqual(stub.received, 20)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestResponseCache(unittest.TestCase):
+    request = Packet.build_request(name="example.com")
+
+    def response(self, raw_tail: bytes, flags: bytes = b"\x81\x80", counts: bytes = b"\x00\x01\x00\x00") -> Packet:
+        raw = b"\x12\x34" + flags + b"\x00\x01" + counts + b"\x00\x00" + b"\x07example\x03com\x00\x00\x01\x00\x01" + raw_tail
+        return Packet.build_response(raw, self.request, validate=False)
+
+    def test_ttl_expiry_and_lru(self):
+        clock = FakeClock()
+        cache = ResponseCache(max_entries=2, clock=clock)
+        positive = self.response(b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x3c\x00\x04\xc0\xa8\x00\x01")
+
+        self.assertTrue(cache.put("example.com", 1, positive))
+        self.assertIs(cache.get("Example.com.", 1), positive)
+        clock.now = 61
+        self.assertIsNone(cache.get("example.com", 1))
+
+        for name in ("a.com", "b.com", "c.com"):
+            cache.put(name, 1, positive)
+        self.assertIsNone(cache.get("a.com", 1))
+        self.assertIsNotNone(cache.get("c.com", 1))
+        self.assertEqual(cache.stats(), {"entries": 2, "hits": 2, "misses": 2, "evictions": 1, "expirations": 1, "stale_hits": 0, "prefetches": 0})
+
+    def test_negative_caching_uses_soa_minimum(self):
+        clock = FakeClock()
+        cache = ResponseCache(clock=clock)
+        soa_rdata = b"\x02ns\xc0\x0c\x04root\xc0\x0c" + struct.pack("!IIIII", 1, 7200, 900, 604800, 30)
+        soa = b"\xc0\x0c\x00\x06\x00\x01\x00\x00\x0e\x10" + struct.pack("!H", len(soa_rdata)) + soa_rdata
+        nxdomain = self.response(soa, flags=b"\x81\x83", counts=b"\x00\x00\x00\x01")
+
+        self.assertTrue(cache.put("example.com", 1, nxdomain))
+        clock.now = 29
+        self.assertIs(cache.get("example.com", 1), nxdomain)
+        clock.now = 30
+        self.assertIsNone(cache.get("example.com", 1))
+
+        servfail = self.response(b"", flags=b"\x81\x82", counts=b"\x00\x00\x00\x00")
+        self.assertFalse(cache.put("example.com", 1, servfail))
+
+    def test_stale_and_prefetch_lookups(self):
+        clock = FakeClock()
+        cache = ResponseCache(clock=clock, stale_ttl=30, prefetch_hits=2)
+        positive = self.response(b"\xc0\x0c\x00\x01\x00\x01\x00\x00\x00\x64\x00\x04\xc0\xa8\x00\x01")
+        cache.put("example.com", 1, positive)
+
+        self.assertEqual(cache.lookup("example.com", 1), (positive, False))
+        clock.now = 95
+        self.assertEqual(cache.lookup("example.com", 1), (positive, True))
+        self.assertEqual(cache.lookup("example.com", 1), (positive, False))
+        clock.now = 110
+        self.assertIsNone(cache.get("example.com", 1))
+        self.assertEqual(cache.lookup("example.com", 1), (positive, True))
+        clock.now = 130
+        self.assertEqual(cache.lookup("example.com", 1), (None, False))
+        self.assertEqual((cache.hits, cache.stale_hits, cache.prefetches, cache.expirations), (3, 1, 1, 1))
+
+class TestServerSelection(unittest.IsolatedAsyncioTestCase):
+    async def test_hedged_query_to_runner_up(self):
+        slow, slow_stub, port = await start_stub(drop_first=100)
+        fast, fast_stub, _ = await start_stub(host="127.0.0.2", port=port)
+        try:
+            async with AsyncResolver(["127.0.0.1", "127.0.0.2"], port, timeout=1) as resolver:
+                primary, runner_up = resolver.selector.servers
+                for _ in range(10):
+                    resolver.selector.record_success(primary, 0.01, sample=True)
+                    resolver.selector.record_success(runner_up, 0.02, sample=True)
+
+                response, retries = await resolver.exchange(Packet.build_request("example.com"))
+        finally:
+            slow.close()
+            fast.close()
+
+        self.assertEqual(retries, 0)
+        self.assertEqual(resolver.hedged, 1)
+        self.assertEqual(response.answers[0].data, "10.0.0.1")
+        self.assertEqual((slow_stub.received, fast_stub.received), (1, 1))
+
+    def test_failing_server_is_penalized(self):
+        clock = FakeClock()
+        selector = ServerSelector(["a", "b"], penalty_threshold=2, penalty=10, clock=clock)
+        a, b = selector.servers
+        selector.record_success(a, 0.01, sample=True)
+        selector.record_success(b, 0.05, sample=True)
+        self.assertEqual(selector.ranked(), [a, b])
+
+        selector.record_failure(a)
+        selector.record_failure(a)
+        self.assertEqual(selector.ranked(), [b, a])
+        clock.now = 11
+        selector.record_success(a, 0.01, sample=True)
+        self.assertEqual(selector.ranked(), [a, b])
+
+def encode_name(name: str) -> bytes:
+    return b"".join(bytes([len(l)]) + l.encode() for l in name.split(".") if l) + b"\x00"
+
+def encode_record(name: str, rtype: int, rdata: bytes, ttl: int = 300) -> bytes:
+    return encode_name(name) + struct.pack("!HHIH", rtype, 1, ttl, len(rdata)) + rdata
+
+def message_for(query: bytes, answers=(), authority=(), additional=(), aa: bool = False, rcode: int = 0) -> bytes:
+    flags = 0x8000 | (0x0400 if aa else 0) | rcode
+    header = query[:2] + struct.pack("!HHHHH", flags, 1, len(answers), len(authority), len(additional))
+    return header + query[12 : query.index(b"\x00", 12) + 5] + b"".join(answers) + b"".join(authority) + b"".join(additional)
+
+class StubAuthority(asyncio.DatagramProtocol):
+    # answers from a fixed table of qname -> response builder
+    def __init__(self, table, delays=None):
+        self.table = table
+        self.delays = delays or {}
+        self.received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        qname = DecompressionTable(data).read(12)[0]
+        reply = self.table(qname, data)
+        asyncio.get_running_loop().call_later(self.delays.get(qname, 0), self.transport.sendto, reply, addr)
+
+class TestIterativeResolver(unittest.IsolatedAsyncioTestCase):
+    async def test_follows_referrals_and_caches_zone_cuts(self):
+        A, NS = RecordType.A.value, RecordType.NS.value
+
+        def root(qname, query):
+            return message_for(
+                query,
+                authority=[encode_record("com", NS, encode_name("ns.com"))],
+                additional=[encode_record("ns.com", A, bytes([127, 0, 0, 2]))],
+            )
+
+        def com(qname, query):
+            return message_for(
+                query,
+                authority=[encode_record("example.com", NS, encode_name("ns.example.com"))],
+                additional=[encode_record("ns.example.com", A, bytes([127, 0, 0, 3]))],
+            )
+
+        def example(qname, query):
+            if qname == "missing.example.com":
+                return message_for(query, aa=True, rcode=3)
+            return message_for(query, answers=[encode_record(qname, A, bytes([10, 1, 1, 1]))], aa=True)
+
+        loop = asyncio.get_running_loop()
+        transports, stubs = [], []
+        port = 0
+        for host, table in (("127.0.0.1", root), ("127.0.0.2", com), ("127.0.0.3", example)):
+            transport, stub = await loop.create_datagram_endpoint(
+                lambda table=table: StubAuthority(table), local_addr=(host, port)
+            )
+            port = transport.get_extra_info("sockname")[1]
+            transports.append(transport)
+            stubs.append(stub)
+
+        try:
+            async with IterativeResolver(["127.0.0.1"], port, timeout=1) as resolver:
+                first = await resolver.resolve("www.example.com")
+                second = await resolver.resolve("mail.example.com")
+                with self.assertRaises(NameNotFoundError):
+                    await resolver.resolve("missing.example.com")
+                self.assertEqual(sorted(resolver.delegations.zones()), ["com", "example.com"])
+        finally:
+            for transport in transports:
+                transport.close()
+
+        self.assertEqual(first.answers[0].data, "10.1.1.1")
+        self.assertTrue(first.authoritative)
+        self.assertEqual(second.answers[0].name, "mail.example.com")
+        self.assertEqual([s.received for s in stubs], [1, 1, 3])
+
+    def test_delegation_cache_is_bounded(self):
+        clock = FakeClock()
+        cache = DelegationCache(["127.0.0.1"], clock=clock, max_entries=2)
+        cache.add_cut("a.com", ["10.0.0.1"], 60)
+        cache.add_cut("b.com", ["10.0.0.2"], 60)
+        cache.find("www.a.com")
+        cache.add_cut("c.com", ["10.0.0.3"], 60)
+        self.assertEqual((sorted(cache.zones()), cache.evictions), (["a.com", "c.com"], 1))
+
+        cache.add_addresses("ns.a.com", ["10.0.0.1"], 10)
+        clock.now = 61
+        self.assertEqual(cache.find("www.a.com").zone, "")
+        self.assertEqual(cache.get_addresses("ns.a.com"), [])
+        self.assertEqual(len(cache), 1)
+
+    async def test_out_of_bailiwick_glue_is_ignored(self):
+        A, NS = RecordType.A.value, RecordType.NS.value
+
+        def root(qname, query):
+            tld = qname.rsplit(".", 1)[-1]
+            return message_for(
+                query,
+                authority=[encode_record(tld, NS, encode_name(f"ns.{tld}"))],
+                additional=[encode_record(f"ns.{tld}", A, bytes([127, 0, 0, 2 if tld == "com" else 4]))],
+            )
+
+        def com(qname, query):
+            # glue for a name outside com, pointing nowhere
+            return message_for(
+                query,
+                authority=[encode_record("example.com", NS, encode_name("ns.example.org"))],
+                additional=[encode_record("ns.example.org", A, bytes([127, 0, 0, 5]))],
+            )
+
+        def org(qname, query):
+            return message_for(query, answers=[encode_record(qname, A, bytes([127, 0, 0, 3]))], aa=True)
+
+        def example(qname, query):
+            return message_for(query, answers=[encode_record(qname, A, bytes([10, 1, 1, 1]))], aa=True)
+
+        loop = asyncio.get_running_loop()
+        transports = []
+        port = 0
+        for host, table in (("127.0.0.1", root), ("127.0.0.2", com), ("127.0.0.3", example), ("127.0.0.4", org)):
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda table=table: StubAuthority(table), local_addr=(host, port)
+            )
+            port = transport.get_extra_info("sockname")[1]
+            transports.append(transport)
+
+        try:
+            async with IterativeResolver(["127.0.0.1"], port, timeout=0.2, retries=0) as resolver:
+                resolution = await resolver.resolve("www.example.com")
+                self.assertEqual(resolver.delegations.get_addresses("ns.example.org"), ["127.0.0.3"])
+        finally:
+            for transport in transports:
+                transport.close()
+
+        self.assertEqual(resolution.answers[0].data, "10.1.1.1")
+
+    async def test_busy_resolvers_are_not_evicted(self):
+        A, NS = RecordType.A.value, RecordType.NS.value
+
+        def root(qname, query):
+            return message_for(
+                query,
+                authority=[encode_record("com", NS, encode_name("ns.com"))],
+                additional=[encode_record("ns.com", A, bytes([127, 0, 0, 2]))],
+            )
+
+        def com(qname, query):
+            return message_for(query, answers=[encode_record(qname, A, bytes([10, 1, 1, 1]))], aa=True)
+
+        loop = asyncio.get_running_loop()
+        root_transport, _ = await loop.create_datagram_endpoint(
+            lambda: StubAuthority(root, delays={"slow.com": 0.1}), local_addr=("127.0.0.1", 0)
+        )
+        port = root_transport.get_extra_info("sockname")[1]
+        com_transport, _ = await loop.create_datagram_endpoint(
+            lambda: StubAuthority(com), local_addr=("127.0.0.2", port)
+        )
+        try:
+            async with IterativeResolver(["127.0.0.1"], port, timeout=1) as resolver:
+                # the referral for fast.com opens a second resolver while
+                # the root one still waits for slow.com
+                resolver.MAX_RESOLVERS = 1
+                slow, fast = await asyncio.gather(resolver.resolve("slow.com"), resolver.resolve("fast.com"))
+        finally:
+            root_transport.close()
+            com_transport.close()
+
+        self.assertEqual([slow.answers[0].data, fast.answers[0].data], ["10.1.1.1", "10.1.1.1"])
+
+class TestTcpFallback(unittest.IsolatedAsyncioTestCase):
+    async def test_truncated_answers_retry_over_pooled_tcp(self):
+        transport, stub, port = await start_stub(truncate=True)
+        tcp_stub = StubTcpServer()
+        server = await asyncio.start_server(tcp_stub.handle, "127.0.0.1", port)
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2) as resolver:
+                responses = await asyncio.gather(*(resolver.query(f"host{i}.example.com") for i in range(20)))
+                self.assertEqual(resolver.tcp.connection_count("127.0.0.1", port), 1)
+        finally:
+            transport.close()
+            server.close()
+
+        self.assertEqual(tcp_stub.queries, 20)
+        self.assertEqual(tcp_stub.connections, 1)
+        for i, response in enumerate(responses):
+            self.assertFalse(response.header.truncated)
+            self.assertEqual(response.answers[0].data, "10.0.0.2")
+            self.assertIn(f"host{i}", response.question.name)
+
+    async def test_tcp_failures_raise_dns_errors(self):
+        # nothing listens on the TCP side of the truncating stub
+        transport, stub, port = await start_stub(truncate=True)
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2) as resolver:
+                with self.assertRaises(ConnectionFailedError):
+                    await resolver.query("example.com")
+        finally:
+            transport.close()
+
+        async def silent(reader, writer):
+            await reader.read()
+            writer.close()
+
+        server = await asyncio.start_server(silent, "127.0.0.1", 0)
+        pool = TcpConnectionPool()
+        try:
+            with self.assertRaises(QueryTimeoutError):
+                await pool.exchange("127.0.0.1", server.sockets[0].getsockname()[1], Packet.build_request("example.com"), 0.05)
+        finally:
+            pool.close()
+            server.close()
+
+class TestResolve(unittest.IsolatedAsyncioTestCase):
+    async def test_resolution_and_typed_errors(self):
+        transport, stub, port = await start_stub()
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2) as resolver:
+                resolution = await resolver.resolve("example.com", mx=True)
+                self.assertEqual(resolution.qtype, RecordType.MX)
+                self.assertEqual(resolution.response_code, 0)
+                self.assertEqual(resolution.retries, 0)
+                self.assertGreater(resolution.elapsed, 0)
+                self.assertEqual(resolution.answers[0].data, "10.0.0.1")
+
+                stub.rcode = 3
+                with self.assertRaises(NameNotFoundError):
+                    await resolver.resolve("missing.example.com")
+        finally:
+            transport.close()
+
+class TestQueryCoalescing(unittest.IsolatedAsyncioTestCase):
+    async def test_identical_questions_share_one_query(self):
+        transport, stub, port = await start_stub()
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2) as resolver:
+                responses = await asyncio.gather(
+                    *(resolver.query("Example.com" if i % 2 else "example.com") for i in range(10)),
+                    resolver.query("example.com", mx=True),
+                )
+                self.assertEqual(resolver.coalesced, 9)
+                await resolver.query("example.com")
+        finally:
+            transport.close()
+
+        self.assertEqual(stub.received, 3)
+        self.assertTrue(all(r is responses[0] for r in responses[:10]))
+        self.assertIsNot(responses[10], responses[0])
+
+class TestFakeServer(unittest.IsolatedAsyncioTestCase):
+    ZONE = """
+    example.com. 3600 SOA ns.example.com. admin.example.com. 1 3600 600 86400 300
+    example.com. MX 10 mail.example.com.
+    example.com. A 10.0.0.1
+    www.example.com. CNAME example.com.
+    *.hosts.example.com. 60 A 10.0.0.9
+    """
+
+    async def test_zone_answers(self):
+        async with FakeServer(Zone.from_text(self.ZONE)) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=2) as resolver:
+                www = await resolver.resolve("www.example.com")
+                mx = await resolver.resolve("example.com", mx=True)
+                wildcard = await resolver.resolve("a.b.hosts.example.com")
+                with self.assertRaises(NameNotFoundError):
+                    await resolver.resolve("missing.example.com")
+                nodata = await resolver.query("www.example.com", ns=True)
+
+        self.assertEqual([a.data for a in www.answers], ["example.com", "10.0.0.1"])
+        self.assertTrue(www.authoritative)
+        self.assertEqual((mx.answers[0].preference, mx.answers[0].data), (10, "mail.example.com"))
+        self.assertEqual((wildcard.answers[0].data, wildcard.answers[0].ttl), ("10.0.0.9", 60))
+        self.assertEqual(nodata.authoritative_records[0].data_type, RecordType.SOA.value)
+
+    async def test_injected_faults(self):
+        zone = Zone.from_text(self.ZONE)
+        async with FakeServer(zone, loss=0.3, truncate=0.3, rcodes={"broken.example.com": 2}, seed=7) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=0.05, retries=8) as resolver:
+                resolutions = await asyncio.gather(*(resolver.resolve(f"h{i}.hosts.example.com") for i in range(50)))
+                dropped = server.dropped
+                with self.assertRaises(ServerFailureError):
+                    await resolver.resolve("broken.example.com")
+
+        self.assertGreater(dropped, 0)
+        self.assertGreater(server.truncated, 0)
+        self.assertTrue(0 < server.tcp_queries <= server.truncated)
+        self.assertGreaterEqual(sum(r.retries for r in resolutions), dropped)
+        self.assertTrue(all(r.answers[0].data == "10.0.0.9" for r in resolutions))
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    def test_histogram_and_prometheus_export(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for value in (0.0005, 0.002, 0.003, 0.05, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [(0.001, 1), (0.01, 3), (0.1, 4), (float("inf"), 5)])
+        self.assertEqual(histogram.percentile(0.5), 0.01)
+        self.assertEqual(histogram.percentile(1.0), 0.1)
+
+        metrics = Metrics()
+        metrics.count("timeouts", server="127.0.0.1")
+        metrics.count("timeouts", 2, server="127.0.0.1")
+        text = metrics.to_prometheus()
+        self.assertIn("# TYPE dns_client_timeouts_total counter", text)
+        self.assertIn('dns_client_timeouts_total{server="127.0.0.1"} 3', text)
+
+    async def test_resolver_records_phases_and_counters(self):
+        zone = Zone.from_text("*.example.com. 60 A 10.0.0.1")
+        metrics = Metrics()
+        traces = []
+        metrics.subscribe(traces.append)
+        async with FakeServer(zone, loss=0.3, truncate=0.2, seed=3) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=0.05, retries=8, cache=ResponseCache(), metrics=metrics) as resolver:
+                await asyncio.gather(*(resolver.query(f"h{i}.example.com") for i in range(20)))
+                await resolver.query("h0.example.com")
+
+        self.assertEqual(len(traces), 20)
+        self.assertEqual(metrics.get("responses", qtype="A", rcode="0"), 20)
+        self.assertEqual(metrics.get("cache_hits"), 1)
+        self.assertEqual(metrics.get("cache_misses"), 20)
+        self.assertEqual(metrics.get("retries"), sum(t.retries for t in traces))
+        self.assertEqual(metrics.get("truncated"), sum(t.truncated for t in traces))
+        self.assertEqual(metrics.get("truncated"), server.tcp_queries)
+        self.assertGreaterEqual(metrics.get("timeouts", server="127.0.0.1"), metrics.get("retries"))
+        self.assertEqual(metrics.latency[("127.0.0.1", "A")].count, 20)
+        for trace in traces:
+            self.assertEqual(trace.server, "127.0.0.1")
+            self.assertGreater(trace.build, 0)
+            self.assertGreater(trace.wait, 0)
+            self.assertLessEqual(trace.wait + trace.retry + trace.tcp, trace.elapsed)
+            self.assertEqual(trace.tcp > 0, trace.truncated)
+        snapshot = json.loads(metrics.to_json())
+        self.assertEqual(snapshot["phases"]["parse"]["count"], 20)
+
+class TestPacing(unittest.IsolatedAsyncioTestCase):
+    def test_token_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, burst=2, clock=clock)
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.1, 0.2])
+        clock.now = 1.0
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+
+    def test_aimd_rate(self):
+        scheduler = SendScheduler(100, window=10, threshold=0.1, increase=20, min_rate=10, clock=FakeClock())
+        for timeouts in (2, 2, 2, 2, 0, 0, 0, 0):
+            for i in range(10):
+                scheduler.release("127.0.0.1", timed_out=i < timeouts)
+        # 100 -> 50 -> 25 -> 12.5 -> 10 (floor), then +20 per clean window up to 100
+        self.assertEqual(scheduler.get_rate("127.0.0.1"), 90)
+        self.assertEqual((scheduler.decreases, scheduler.increases), (4, 4))
+        for i in range(10):
+            scheduler.release("127.0.0.1")
+        self.assertEqual(scheduler.get_rate("127.0.0.1"), 100)
+        self.assertEqual(scheduler.get_rate("127.0.0.2"), 100)
+
+    async def test_resolver_sends_are_paced(self):
+        zone = Zone.from_text("*.example.com. 60 A 10.0.0.1")
+        loop = asyncio.get_running_loop()
+        async with FakeServer(zone, delay=0.05) as server:
+            pacer = SendScheduler(1000, burst=1, max_outstanding=2)
+            async with AsyncResolver("127.0.0.1", server.port, timeout=2, pacer=pacer) as resolver:
+                start = loop.time()
+                await asyncio.gather(*(resolver.query(f"h{i}.example.com") for i in range(8)))
+                capped = loop.time() - start
+
+            pacer = SendScheduler(40, burst=1)
+            async with AsyncResolver("127.0.0.1", server.port, timeout=2, pacer=pacer) as resolver:
+                start = loop.time()
+                await asyncio.gather(*(resolver.query(f"p{i}.example.com") for i in range(5)))
+                paced = loop.time() - start
+
+        # four rounds of two outstanding queries; four gaps of 1/40 s
+        self.assertGreaterEqual(capped, 0.2)
+        self.assertGreaterEqual(paced, 0.1)
+
+class TestAsyncResolverCache(unittest.IsolatedAsyncioTestCase):
+    async def test_repeated_lookup_served_from_cache(self):
+        transport, stub, port = await start_stub()
+        cache = ResponseCache()
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2, cache=cache) as resolver:
+                first = await resolver.query("example.com")
+                second = await resolver.query("example.com")
+        finally:
+            transport.close()
+
+        self.assertIs(first, second)
+        self.assertEqual(stub.received, 1)
+        self.assertEqual(cache.hits, 1)
+
+class TestStaleWhileRevalidate(unittest.IsolatedAsyncioTestCase):
+    async def test_stale_answers_while_refreshing(self):
+        clock = FakeClock()
+        cache = ResponseCache(clock=clock, stale_ttl=60, prefetch_hits=2)
+        zone = Zone.from_text("example.com. 100 A 10.0.0.1")
+        async with FakeServer(zone) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=0.05, retries=0, cache=cache) as resolver:
+                first = await resolver.query("example.com")
+                await resolver.query("example.com")
+
+                # hot and close to expiry: answered from the cache, refreshed behind
+                clock.now = 95
+                self.assertIs(await resolver.query("example.com"), first)
+                await asyncio.sleep(0.05)
+                self.assertEqual(server.queries, 2)
+                refreshed = await resolver.query("example.com")
+                self.assertIsNot(refreshed, first)
+
+                # expired while the server is failing: the stale answer is kept
+                server.loss = 1.0
+                clock.now = 200
+                self.assertIs(await resolver.query("example.com"), refreshed)
+                await asyncio.sleep(0.1)
+                resolution = await resolver.resolve("example.com")
+                self.assertIs(resolution.packet, refreshed)
+                self.assertTrue(resolution.cached)
+                self.assertEqual(resolver.refreshes, 2)
+
+                # the failure recheck timer has run out: one more refresh
+                clock.now = 231
+                await resolver.query("example.com")
+                await asyncio.sleep(0.1)
+
+                clock.now = 260
+                with self.assertRaises(QueryTimeoutError):
+                    await resolver.query("example.com")
+
+        self.assertEqual(resolver.refreshes, 3)
+        self.assertEqual((cache.prefetches, cache.stale_hits), (1, 3))
+
+    async def test_error_answers_back_off_refreshes(self):
+        clock = FakeClock()
+        cache = ResponseCache(clock=clock, stale_ttl=300)
+        zone = Zone.from_text("example.com. 100 A 10.0.0.1")
+        async with FakeServer(zone) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=0.5, retries=0, cache=cache) as resolver:
+                first = await resolver.query("example.com")
+
+                # a SERVFAIL refresh is not cached, and counts as a failure
+                server.rcodes["example.com"] = 2
+                clock.now = 200
+                for _ in range(10):
+                    self.assertIs(await resolver.query("example.com"), first)
+                    await asyncio.sleep(0.01)
+                self.assertEqual((resolver.refreshes, server.queries), (1, 2))
+
+                clock.now = 231
+                await resolver.query("example.com")
+                await asyncio.sleep(0.05)
+
+        self.assertEqual((resolver.refreshes, server.queries), (2, 3))
+
+class TestDiskCache(unittest.IsolatedAsyncioTestCase):
+    async def test_warm_start_from_disk(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "answers.db")
+        transport, stub, port = await start_stub()
+        try:
+            async with AsyncResolver("127.0.0.1", port, timeout=2, cache=DiskCache(path)) as resolver:
+                await resolver.resolve("example.com")
+        finally:
+            transport.close()
+
+        # a later run answers from disk with the server gone
+        cache = DiskCache(path)
+        async with AsyncResolver("127.0.0.1", port, timeout=0.05, retries=0, cache=cache) as resolver:
+            resolution = await resolver.resolve("EXAMPLE.com")
+
+        self.assertTrue(resolution.cached)
+        self.assertEqual(resolution.answers[0].data, "10.0.0.1")
+        self.assertEqual((stub.received, cache.hits), (1, 1))
+
+    def test_expiry_and_eviction(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "answers.db")
+        clock = FakeClock()
+        cache = DiskCache(path, max_entries=2, clock=clock)
+        for i, ttl in enumerate([30, 60, 90]):
+            request = Packet.build_request(f"host{i}.example.com")
+            raw = answer_for(bytes(request.pack()), ttl=ttl)
+            self.assertTrue(cache.put(f"host{i}.example.com", RecordType.A.value, Packet.build_response(raw, request)))
+
+        cache.prune()
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        self.assertIsNone(cache.get("host0.example.com", RecordType.A.value))
+
+        clock.now += 61
+        self.assertIsNone(cache.get("host1.example.com", RecordType.A.value))
+        self.assertIsNotNone(cache.get("host2.example.com", RecordType.A.value))
+        cache.close()
+
+    async def test_stale_answers_and_prefetch(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "answers.db")
+        clock = FakeClock()
+        cache = DiskCache(path, clock=clock, stale_ttl=60, prefetch_hits=2)
+        zone = Zone.from_text("example.com. 100 A 10.0.0.1")
+        async with FakeServer(zone) as server:
+            async with AsyncResolver("127.0.0.1", server.port, timeout=0.05, retries=0, cache=cache) as resolver:
+                await resolver.query("example.com")
+                await resolver.query("example.com")
+
+                clock.now = 95
+                await resolver.query("example.com")
+                await asyncio.sleep(0.05)
+                self.assertEqual(server.queries, 2)
+
+                # expired while the server is failing: the stale answer is kept
+                server.loss = 1.0
+                clock.now = 200
+                response = await resolver.query("example.com")
+                await asyncio.sleep(0.1)
+                await resolver.query("example.com")
+
+        self.assertEqual(response.answers[0].data, "10.0.0.1")
+        self.assertEqual(resolver.refreshes, 2)
+        self.assertEqual((cache.prefetches, cache.stale_hits), (1, 2))
+        cache.close()
+
+    def test_daemon_settings_carry_over(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "answers.db")
+        config = make_config(53, cache_file=path)
+        resolver = create_resolver(config, cache=ResponseCache(stale_ttl=60, prefetch_hits=3))
+
+        self.assertIsInstance(resolver.cache, DiskCache)
+        self.assertEqual((resolver.cache.stale_ttl, resolver.cache.prefetch_hits), (60, 3))
+        resolver.close()
+        resolver.cache.close()
+
+class TestLocalDaemon(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.upstream, self.stub, port = await start_stub()
+        resolver = AsyncResolver("127.0.0.1", port, timeout=2, cache=ResponseCache())
+        self.daemon = LocalDaemon(resolver)
+        await self.daemon.listen("127.0.0.1:0")
+        self.port = self.daemon.addresses()[0][1]
+
+    async def asyncTearDown(self):
+        self.daemon.close()
+        self.upstream.close()
+
+    async def test_udp_and_tcp_clients_share_cache(self):
+        async with AsyncResolver("127.0.0.1", self.port, timeout=2) as client:
+            first = await client.resolve("example.com")
+            request = Packet.build_request("example.com", payload_size=None)
+            raw = await client.tcp.exchange("127.0.0.1", self.port, request, 2)
+        async with AsyncResolver("127.0.0.1", self.port, timeout=2) as client:
+            second = await client.resolve("EXAMPLE.com")
+
+        self.assertEqual([first.answers[0].data, second.answers[0].data], ["10.0.0.1", "10.0.0.1"])
+        self.assertEqual(Packet.build_response(raw, request).answers[0].data, "10.0.0.1")
+        self.assertEqual((self.stub.received, self.daemon.queries), (1, 3))
+
+    async def test_unsupported_and_malformed_queries(self):
+        query = bytes(Packet.build_request("example.com").pack())
+        aaaa = query[:-4] + struct.pack("!HH", RecordType.AAAA.value, 1)
+        reply = await self.daemon.answer(aaaa)
+        self.assertEqual((reply[:2], reply[3] & 0x0F, reply[12:]), (aaaa[:2], 4, aaaa[12:]))
+
+        reply = await self.daemon.answer(query[:-2])
+        self.assertEqual(reply[3] & 0x0F, 1)
+
+    async def test_cached_answers_count_ttls_down(self):
+        transport, stub, port = await start_stub()
+        clock = FakeClock()
+        cache = ResponseCache(clock=clock, stale_ttl=300)
+        daemon = LocalDaemon(AsyncResolver("127.0.0.1", port, timeout=2, cache=cache))
+        request = Packet.build_request("example.com", payload_size=None)
+        ttls = []
+        try:
+            for now in (0, 20, 70):
+                clock.now = now
+                reply = await daemon.answer(bytes(request.pack()))
+                ttls.append(Packet.build_response(reply, request).answers[0].ttl)
+        finally:
+            daemon.close()
+            transport.close()
+
+        # a stale answer is served with a short TTL (RFC 8767)
+        self.assertEqual(ttls, [60, 40, 30])
+
+    def test_opt_echoed_only_to_edns_queries(self):
+        plain = answer_for(bytes(Packet.build_request("example.com", payload_size=None).pack()))
+        wire = plain[:11] + b"\x01" + plain[12:] + b"\x00" + struct.pack("!HHIH", PacketOpt.TYPE, 1232, 0, 0)
+
+        self.assertEqual(bytes(adjust_response(wire, None, edns=False)), plain)
+        self.assertEqual(bytes(adjust_response(wire, None, edns=True)), wire)
+
+    async def test_thin_client_over_unix_socket(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "dns.sock")
+        await self.daemon.listen(path)
+        output = io.BytesIO()
+        lines = [b"host1.example.com\n", b"# comment\n", b"host2.example.com MX\n"]
+        await asyncio.to_thread(thin.query, path, lines, output)
+
+        results = output.getvalue().decode().splitlines()
+        self.assertEqual([r.split(" \t ")[0] for r in results], ["host1.example.com", "host2.example.com"])
+        self.assertIn(" \t A \t 10.0.0.1 \t 60 \t nonauth", results[0])
+
+def udp_frame(payload: bytes, sport: int = 40000, dport: int = 53) -> bytes:
+    # Ethernet + IPv4 + UDP
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, bytes([10, 0, 0, 1]), bytes([10, 0, 0, 53]))
+    return b"\x00" * 12 + b"\x08\x00" + ip + udp
+
+def tcp_packet_v6(payload: bytes, sport: int = 53, dport: int = 40000) -> bytes:
+    # raw IPv6 + TCP
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, 0x18, 65535, 0, 0) + payload
+    return struct.pack("!IHBB16s16s", 6 << 28, len(tcp), 6, 64, socket.inet_pton(socket.AF_INET6, "2001:db8::53"), socket.inet_pton(socket.AF_INET6, "2001:db8::1")) + tcp
+
+def pcapng_block(block_type: int, body: bytes) -> bytes:
+    body += b"\x00" * (-len(body) % 4)
+    return struct.pack("<II", block_type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+class TestCaptureReader(unittest.TestCase):
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.query = bytes(Packet.build_request("example.com").pack())
+        self.response = answer_for(self.query)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_pcap_udp(self):
+        frames = [udp_frame(self.query), udp_frame(self.response, 53, 40000), udp_frame(b"x", 1234, 5678), udp_frame(b"\x00" * 5)]
+        data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+        for i, link_frame in enumerate(frames):
+            data += struct.pack("<IIII", 100 + i, 500000, len(link_frame), len(link_frame)) + link_frame
+
+        reader = CaptureReader(self.write("dns.pcap", data))
+        messages = list(reader)
+
+        self.assertEqual((reader.frames, reader.messages, reader.skipped), (4, 3, 1))
+        query, response, malformed = messages
+        self.assertEqual(query.timestamp, 100.5)
+        self.assertEqual((query.source, query.destination), (("10.0.0.1", 40000), ("10.0.0.53", 53)))
+        self.assertFalse(query.packet.header.response)
+        self.assertEqual((query.packet.question.name, query.packet.question.qtype), ("example.com", RecordType.A))
+        self.assertEqual(response.packet.answers[0].data, "10.0.0.1")
+        with self.assertRaises(MalformedPacketError):
+            malformed.packet
+
+    def test_pcapng_tcp_ipv6(self):
+        stream = frame(self.response) + frame(answer_for(self.query, "10.0.0.2"))
+        shb = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        idb = pcapng_block(1, struct.pack("<HHI", 101, 0, 65535) + struct.pack("<HHB", 9, 1, 9) + b"\x00" * 3 + b"\x00" * 4)
+        packet = tcp_packet_v6(stream)
+        epb = pcapng_block(6, struct.pack("<IIIII", 0, 0, 2_500_000_000, len(packet), len(packet)) + packet)
+
+        messages = list(CaptureReader(self.write("dns.pcapng", shb + idb + epb)))
+
+        self.assertEqual([m.transport for m in messages], ["tcp", "tcp"])
+        self.assertEqual(messages[0].source, ("2001:db8::53", 53))
+        self.assertAlmostEqual(messages[0].timestamp, 2.5)
+        self.assertEqual([m.packet.answers[0].data for m in messages], ["10.0.0.1", "10.0.0.2"])
+
+    def test_pcapng_block_shorter_than_its_fields(self):
+        shb = pcapng_block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+        idb = pcapng_block(1, struct.pack("<HHI", 1, 0, 65535))
+        # an enhanced packet block ending inside its fixed fields
+        epb = pcapng_block(6, struct.pack("<II", 0, 0))
+
+        with self.assertRaises(CaptureError):
+            list(CaptureReader(self.write("dns.pcapng", shb + idb + epb)))
+
+    def test_verbose_counts_undecodable_records_as_malformed(self):
+        # an SRV record too short for its fields only fails when decoded
+        srv = b"\xc0\x0c" + struct.pack("!HHIH", RecordType.SRV.value, 1, 60, 2) + b"\x00\x0a"
+        frames = [udp_frame(self.response, 53, 40000), udp_frame(self.response[:-16] + srv, 53, 40000)]
+        data = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+        for link_frame in frames:
+            data += struct.pack("<IIII", 0, 0, len(link_frame), len(link_frame)) + link_frame
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            self.assertEqual(pcap.main([self.write("dns.pcap", data), "-v"]), 0)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 1)
+        self.assertIn("(1 malformed)", stderr.getvalue())
+
+    def test_not_a_capture(self):
+        with self.assertRaises(CaptureError):
+            list(CaptureReader(self.write("notes.txt", b"hello world")))
+
+class TestBulkTransmitter(unittest.IsolatedAsyncioTestCase):
+    async def test_run_streams_results(self):
+        transport, stub, port = await start_stub()
+        config = make_config(port, payload_size=1232)
+        output = io.StringIO()
+        lines = ["# comment", ""] + [f"host{i}.example.com" for i in range(10)] + ["host10.example.com"]
+        try:
+            await BulkTransmitter(config, output).run(read_names(iter(lines)))
+        finally:
+            transport.close()
+
+        results = output.getvalue().splitlines()
+        self.assertEqual(len(results), 11)
+        self.assertEqual(
+            sorted(r.split(" \t ")[0] for r in results),
+            sorted(f"host{i}.example.com" for i in range(11)),
+        )
+        self.assertTrue(all(" \t A \t 10.0.0.1 \t 60 \t nonauth" in r for r in results))
+
+    async def test_malformed_answer_is_that_lines_error(self):
+        def table(qname, query):
+            reply = answer_for(query)
+            # a 3-byte A record for one of the names
+            return reply[:-6] + b"\x00\x03\x0a\x00\x00" if qname == "bad.example.com" else reply
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: StubAuthority(table), local_addr=("127.0.0.1", 0))
+        config = make_config(transport.get_extra_info("sockname")[1], retries=0)
+        output = io.StringIO()
+        try:
+            await BulkTransmitter(config, output).run(["good.example.com", "bad.example.com"])
+        finally:
+            transport.close()
+
+        results = sorted(output.getvalue().splitlines())
+        self.assertEqual(len(results), 2)
+        self.assertTrue(results[0].startswith("bad.example.com \t ERROR"))
+        self.assertIn(" \t A \t 10.0.0.1", results[1])
+
+class TestOutputSinks(unittest.IsolatedAsyncioTestCase):
+    async def run_bulk(self, output_format, output):
+        transport, stub, port = await start_stub()
+        config = make_config(port, output_format=output_format)
+        try:
+            await BulkTransmitter(config, output).run([f"host{i}.example.com" for i in range(5)])
+        finally:
+            transport.close()
+
+    async def test_structured_formats(self):
+        output = io.StringIO()
+        await self.run_bulk("jsonl", output)
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(sorted(line["name"] for line in lines), [f"host{i}.example.com" for i in range(5)])
+        self.assertEqual(lines[0]["answers"][0]["data"], "10.0.0.1")
+        self.assertEqual(lines[0]["type"], "A")
+
+        output = io.StringIO()
+        await self.run_bulk("csv", output)
+        rows = list(csv.reader(io.StringIO(output.getvalue())))
+        self.assertEqual(rows[0], CsvFormat.COLUMNS)
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][1:], ["OK", "A", "10.0.0.1", "0", "60", "nonauth"])
+
+        output = io.BytesIO()
+        await self.run_bulk("binary", output)
+        wire, messages = output.getvalue(), []
+        while wire:
+            (length,) = struct.unpack("!H", wire[:2])
+            messages.append(wire[2 : 2 + length])
+            wire = wire[2 + length :]
+        self.assertEqual(len(messages), 5)
+        request = Packet.build_request("host0.example.com")
+        self.assertEqual(Packet.build_response(messages[0], request).answers[0].data, "10.0.0.1")
+
+    async def test_sharded_binary_output(self):
+        transport, stub, port = await start_stub()
+        config = make_config(port, concurrency=3, workers=2, ordered=False, output_format="binary")
+        output = io.BytesIO()
+        try:
+            transmitter = ShardedTransmitter(config, output)
+            names = iter(f"host{i}.example.com" for i in range(10))
+            await asyncio.get_running_loop().run_in_executor(None, transmitter.run, names)
+        finally:
+            transport.close()
+
+        wire, count = output.getvalue(), 0
+        while wire:
+            (length,) = struct.unpack("!H", wire[:2])
+            wire = wire[2 + length :]
+            count += 1
+        self.assertEqual(count, 10)
+
+    def test_sink_batches_writes(self):
+        class CountingStream(io.StringIO):
+            writes = 0
+
+            def write(self, s):
+                self.writes += 1
+                return super().write(s)
+
+        stream = CountingStream()
+        with OutputSink(TextFormat(), stream, buffer_size=100) as sink:
+            for i in range(50):
+                sink.write(f"line {i:02d}\n")
+        self.assertEqual(stream.getvalue(), "".join(f"line {i:02d}\n" for i in range(50)))
+        self.assertEqual(stream.writes, 4)
+
 if __name__ == '__main__':
     unittest.main()